@@ -1,7 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import logging
+import aiohttp
+from lxml import etree
 from urllib.parse import urlparse, urljoin
 
+from scraper.robots_cache import RobotsCache
+from scraper.sitemap import SITEMAP_LOC_TAGS, release_element
+
+CHUNK_SIZE = 64 * 1024
+logger = logging.getLogger(__name__)
+# robots.txt is fetched once per host, however many times the parser runs
+robots_cache = RobotsCache()
+
 def is_valid_url(url, base_netloc):
     try:
         parsed = urlparse(url)
@@ -9,108 +19,122 @@ def is_valid_url(url, base_netloc):
     except:
         return False
 
-def debug_sitemap_parsing(start_url):
+async def iter_response_locs(response):
+    """Yield <loc> texts while the sitemap body is still arriving"""
+    parser = etree.XMLPullParser(events=('end',), tag=SITEMAP_LOC_TAGS)
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        parser.feed(chunk)
+        for _, loc in parser.read_events():
+            url = (loc.text or '').strip()
+            release_element(loc)
+            yield url
+    parser.close()
+    for _, loc in parser.read_events():
+        url = (loc.text or '').strip()
+        release_element(loc)
+        yield url
+
+async def fetch_all(session, urls):
+    """Issue all requests at once; callers must release the returned responses"""
+    return await asyncio.gather(*[session.get(url) for url in urls], return_exceptions=True)
+
+def release_all(responses):
+    for response in responses:
+        if not isinstance(response, BaseException):
+            response.release()
+
+async def iter_sitemap_locs(response, base_netloc):
+    """Yield the same-domain URLs listed in a fetched sitemap response"""
+    if isinstance(response, BaseException):
+        raise response
+    logger.debug("Response status: %s", response.status)
+    logger.debug("Content type: %s", response.headers.get('content-type', ''))
+    if response.status != 200 or "xml" not in response.headers.get('content-type', ''):
+        logger.debug("Sitemap %s is not valid XML or not found", response.url)
+        return
+    loc_total = 0
+    async for url in iter_response_locs(response):
+        loc_total += 1
+        logger.debug("Found URL in sitemap: %s", url)
+        if is_valid_url(url, base_netloc):
+            yield url
+        else:
+            logger.debug("URL %s is not valid for domain %s", url, base_netloc)
+    logger.debug("Found %s loc elements in sitemap", loc_total)
+
+async def debug_sitemap_parsing(start_url):
     base_netloc = urlparse(start_url).netloc
     discovered_urls = set()
-    
-    # Create a session with retry strategy for requests
-    session = requests.Session()
-    
-    # 1. Check for sitemap.xml
-    sitemap_urls = [
-        urljoin(start_url, '/sitemap.xml'),
-        urljoin(start_url, '/sitemap_index.xml'),
-        urljoin(start_url, '/sitemaps.xml'),
-        urljoin(start_url, '/sitemap/sitemap.xml')
-    ]
-    
-    print("Checking for sitemaps...")
-    sitemap_found = False
-    for sitemap_url in sitemap_urls:
+
+    # One session (connection pool + DNS cache) for every probe
+    connector = aiohttp.TCPConnector(limit_per_host=4, ttl_dns_cache=300, use_dns_cache=True)
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        # 1. Check for sitemap.xml
+        sitemap_urls = [
+            urljoin(start_url, '/sitemap.xml'),
+            urljoin(start_url, '/sitemap_index.xml'),
+            urljoin(start_url, '/sitemaps.xml'),
+            urljoin(start_url, '/sitemap/sitemap.xml')
+        ]
+
+        # Probe every candidate and robots.txt concurrently, then process the results in order
+        logger.debug("Checking for sitemaps...")
+        responses, robots = await asyncio.gather(
+            fetch_all(session, sitemap_urls),
+            robots_cache.get(session, start_url)
+        )
         try:
-            print(f"Checking sitemap: {sitemap_url}")
-            response = session.get(sitemap_url, timeout=10)
-            print(f"Response status: {response.status_code}")
-            print(f"Content type: {response.headers.get('content-type', '')}")
-            if response.status_code == 200 and "xml" in response.headers.get('content-type', ''):
-                print(f"Sitemap content preview: {response.text[:500]}")
-                soup = BeautifulSoup(response.text, 'xml')
-                # Extract URLs from sitemap
-                loc_elements = soup.find_all('loc')
-                print(f"Found {len(loc_elements)} loc elements in sitemap")
-                loc_count = 0
-                for loc in loc_elements:
-                    url = loc.text.strip()
-                    print(f"Found URL in sitemap: {url}")
-                    if is_valid_url(url, base_netloc):
+            sitemap_found = False
+            for sitemap_url, response in zip(sitemap_urls, responses):
+                logger.debug("Checking sitemap: %s", sitemap_url)
+                try:
+                    loc_count = 0
+                    async for url in iter_sitemap_locs(response, base_netloc):
                         discovered_urls.add(url)
                         loc_count += 1
-                        print(f"Added valid sitemap URL: {url}")
-                    else:
-                        print(f"URL {url} is not valid for domain {base_netloc}")
-                if loc_count > 0:
-                    print(f"Found {loc_count} URLs in sitemap {sitemap_url}")
-                    sitemap_found = True
-                    break
-                else:
-                    print(f"No valid URLs found in sitemap {sitemap_url}")
-            else:
-                print(f"Sitemap {sitemap_url} is not valid XML or not found")
-        except Exception as e:
-            print(f"Sitemap {sitemap_url} not accessible: {e}")
-            continue
-    
-    # 2. Check robots.txt for sitemap references
-    try:
-        robots_url = urljoin(start_url, '/robots.txt')
-        print(f"Checking robots.txt: {robots_url}")
-        response = session.get(robots_url, timeout=10)
-        print(f"Robots.txt response status: {response.status_code}")
-        if response.status_code == 200:
-            robots_content = response.text
-            print(f"Robots.txt content preview: {robots_content[:500]}")
-            import re
-            sitemap_matches = re.findall(r'Sitemap:\s*(.+)', robots_content, re.IGNORECASE)
-            print(f"Found {len(sitemap_matches)} sitemap references in robots.txt")
-            if sitemap_matches:
-                for sitemap_url in sitemap_matches:
-                    sitemap_url = sitemap_url.strip()
+                    if loc_count > 0:
+                        logger.debug("Found %s URLs in sitemap %s", loc_count, sitemap_url)
+                        sitemap_found = True
+                        break
+                    logger.debug("No valid URLs found in sitemap %s", sitemap_url)
+                except Exception as e:
+                    logger.warning("Sitemap %s not accessible: %s", sitemap_url, e)
+
+            # 2. Check robots.txt for sitemap references
+            try:
+                logger.debug("Checking robots.txt: %s", robots.url)
+                sitemap_matches = robots.site_maps()
+                if sitemap_matches is not None:
+                    logger.debug("Found %s sitemap references in robots.txt", len(sitemap_matches))
+                    sitemap_responses = await fetch_all(session, sitemap_matches)
                     try:
-                        print(f"Checking robots.txt sitemap: {sitemap_url}")
-                        sitemap_response = session.get(sitemap_url, timeout=10)
-                        print(f"Robots.txt sitemap response status: {sitemap_response.status_code}")
-                        if sitemap_response.status_code == 200 and "xml" in sitemap_response.headers.get('content-type', ''):
-                            print(f"Sitemap content preview: {sitemap_response.text[:500]}")
-                            soup = BeautifulSoup(sitemap_response.text, 'xml')
-                            loc_elements = soup.find_all('loc')
-                            print(f"Found {len(loc_elements)} loc elements in sitemap")
-                            loc_count = 0
-                            for loc in loc_elements:
-                                url = loc.text.strip()
-                                print(f"Found URL in sitemap: {url}")
-                                if is_valid_url(url, base_netloc):
+                        for sitemap_url, sitemap_response in zip(sitemap_matches, sitemap_responses):
+                            logger.debug("Checking robots.txt sitemap: %s", sitemap_url)
+                            try:
+                                loc_count = 0
+                                async for url in iter_sitemap_locs(sitemap_response, base_netloc):
                                     discovered_urls.add(url)
                                     loc_count += 1
-                                    print(f"Added valid robots.txt sitemap URL: {url}")
-                                else:
-                                    print(f"URL {url} is not valid for domain {base_netloc}")
-                            print(f"Found {loc_count} valid URLs in robots.txt sitemap {sitemap_url}")
-                        else:
-                            print(f"Robots.txt sitemap {sitemap_url} is not valid XML or not found")
-                    except Exception as e:
-                        print(f"Error processing robots.txt sitemap {sitemap_url}: {e}")
-            else:
-                print("No sitemap references found in robots.txt")
-        else:
-            print(f"Robots.txt not found or inaccessible")
-    except Exception as e:
-        print(f"Error checking robots.txt: {e}")
-    
-    print(f"Total discovered URLs: {len(discovered_urls)}")
+                                logger.debug("Found %s valid URLs in robots.txt sitemap %s", loc_count, sitemap_url)
+                            except Exception as e:
+                                logger.warning("Error processing robots.txt sitemap %s: %s", sitemap_url, e)
+                    finally:
+                        release_all(sitemap_responses)
+                else:
+                    logger.debug("No sitemap references found in robots.txt")
+            except Exception as e:
+                logger.warning("Error checking robots.txt: %s", e)
+        finally:
+            release_all(responses)
+
+    logger.info("Total discovered URLs: %s", len(discovered_urls))
     for url in list(discovered_urls)[:10]:  # Show first 10
-        print(f"  - {url}")
-    
+        logger.info("  - %s", url)
+
     return discovered_urls
 
 if __name__ == "__main__":
-    debug_sitemap_parsing("https://www.chlworldwide.com")
+    # Per-URL tracing is at DEBUG; raise the level here to see it
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    asyncio.run(debug_sitemap_parsing("https://www.chlworldwide.com"))
@@ -1,31 +1,63 @@
 import asyncio
 import aiohttp
 import logging
-from typing import List, Dict, Any, Optional
+import re
+import socket
+from typing import List, Dict, Optional
 import time
 from urllib.parse import urljoin, urlparse
-import async_timeout
+from aiohttp.resolver import AsyncResolver
+
+MAX_PAGE_SIZE = 10 * 1024 * 1024  # 10 MB
+READ_CHUNK_SIZE = 16 * 1024
+# Bodies worth downloading for text extraction
+TEXT_CONTENT_TYPES = ('text/html', 'application/xhtml', 'text/plain', 'application/xml', 'text/xml')
+# Authority (netloc) of an absolute or protocol-relative URL, matched in one C-level pass
+NETLOC_RE = re.compile(r'(?:[a-zA-Z][a-zA-Z0-9+.-]*:)?//([^/?#]*)')
+
+class FetchError(Exception):
+    """A page that was fetched but cannot be used as text"""
+
+class HTTPStatusError(FetchError):
+    """The server answered with something other than 200"""
+
+class NonTextContentError(FetchError):
+    """The body is binary (PDF, image, ...) and was left unread"""
+
+class PageTooLargeError(FetchError):
+    """The body is larger than the caller's max_bytes"""
 
 class AsyncHTTPClient:
     """Async HTTP client for concurrent web requests"""
     
-    def __init__(self, max_connections=100, timeout=30):
+    def __init__(self, max_connections=100, timeout=30, limit_per_host=64, family=socket.AF_UNSPEC):
         self.max_connections = max_connections
+        self.limit_per_host = limit_per_host
+        # Address family for connections; pass socket.AF_INET to skip IPv6 lookups
+        self.family = family
         self.timeout = timeout
         self.logger = logging.getLogger(__name__)
         self._session = None
     
     async def __aenter__(self):
-        """Async context manager entry"""
+        """Async context manager entry
+
+        The session (connection pool + DNS cache) lives for the whole context so
+        every fetch made through this client reuses keep-alive connections.
+        """
         connector = aiohttp.TCPConnector(
             limit=self.max_connections,
-            limit_per_host=10,
-            ttl_dns_cache=300,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=600,
             use_dns_cache=True,
-            keepalive_timeout=30
+            keepalive_timeout=60,
+            # c-ares based resolver (aiodns) instead of getaddrinfo in a thread pool
+            resolver=AsyncResolver(),
+            family=self.family
         )
         
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        # The session-wide timeout covers every request; no extra per-request timer is needed
+        timeout = aiohttp.ClientTimeout(total=self.timeout, connect=10, sock_read=self.timeout)
         
         self._session = aiohttp.ClientSession(
             connector=connector,
@@ -41,17 +73,42 @@ class AsyncHTTPClient:
         if self._session:
             await self._session.close()
     
-    async def fetch_url(self, url: str, method='GET', **kwargs) -> Optional[str]:
-        """Fetch URL content asynchronously"""
+    async def fetch_text(self, url: str, method='GET', max_bytes=MAX_PAGE_SIZE, **kwargs) -> str:
+        """Fetch a page's text, reading at most max_bytes of the body
+
+        Raises a FetchError subclass saying why a response cannot be used, or the
+        aiohttp/timeout error when there was no response at all.
+        """
+        async with self._session.request(method, url, **kwargs) as response:
+            if response.status != 200:
+                raise HTTPStatusError(f"HTTP {response.status} for {url}")
+            # Leave binary bodies (PDFs, images, ...) unread; the connection is released on exit
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type and not content_type.startswith(TEXT_CONTENT_TYPES):
+                raise NonTextContentError(f"Non-text content ({content_type}) at {url}")
+            if response.content_length and response.content_length > max_bytes:
+                raise PageTooLargeError(f"Content-Length {response.content_length} exceeds limit for {url}")
+            chunks = []
+            total = 0
+            async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                chunks.append(chunk)
+                total += len(chunk)
+                if total > max_bytes:
+                    # No (or a wrong) Content-Length: drop the page as above
+                    # rather than parse a silently truncated body
+                    raise PageTooLargeError(f"Body exceeds {max_bytes} bytes for {url}")
+            return b''.join(chunks).decode(response.charset or 'utf-8', errors='replace')
+    
+    async def fetch_url(self, url: str, method='GET', max_bytes=MAX_PAGE_SIZE, **kwargs) -> Optional[str]:
+        """Fetch URL content asynchronously; None if it cannot be used as text"""
         try:
-            async with async_timeout.timeout(self.timeout):
-                async with self._session.request(method, url, **kwargs) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        return content
-                    else:
-                        self.logger.warning(f"HTTP {response.status} for {url}")
-                        return None
+            return await self.fetch_text(url, method, max_bytes, **kwargs)
+        except NonTextContentError as e:
+            self.logger.debug(f"Skipping: {e}")
+            return None
+        except FetchError as e:
+            self.logger.warning(str(e))
+            return None
         except asyncio.TimeoutError:
             self.logger.error(f"Timeout fetching {url}")
             return None
@@ -59,12 +116,17 @@ class AsyncHTTPClient:
             self.logger.error(f"Error fetching {url}: {e}")
             return None
     
-    async def fetch_multiple(self, urls: List[str], max_concurrent=50) -> Dict[str, Optional[str]]:
-        """Fetch multiple URLs concurrently"""
-        semaphore = asyncio.Semaphore(max_concurrent)
+    async def fetch_multiple(self, urls: List[str], max_concurrent=50,
+                             admission: Optional['AdmissionController'] = None) -> Dict[str, Optional[str]]:
+        """Fetch multiple URLs concurrently
+
+        Pass an AdmissionController to resize the concurrency limit while the batch runs.
+        """
+        if admission is None:
+            admission = AdmissionController(max_concurrent)
         
         async def fetch_one(url):
-            async with semaphore:
+            async with admission:
                 return await self.fetch_url(url)
         
         tasks = [fetch_one(url) for url in urls]
@@ -75,9 +137,8 @@ class AsyncHTTPClient:
     async def check_url_status(self, url: str) -> bool:
         """Check if URL is accessible"""
         try:
-            async with async_timeout.timeout(10):
-                async with self._session.head(url) as response:
-                    return response.status == 200
+            async with self._session.head(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                return response.status == 200
         except:
             return False
     
@@ -108,7 +169,7 @@ class URLValidator:
             url = urljoin(base_url, url)
         
         # Remove fragment
-        url = url.split('#')[0]
+        url = url.partition('#')[0]
         
         # Ensure consistent scheme
         if not url.startswith(('http://', 'https://')):
@@ -118,11 +179,52 @@ class URLValidator:
     
     @staticmethod
     def extract_domain(url: str) -> str:
-        """Extract domain from URL"""
-        try:
-            return urlparse(url).netloc
-        except:
-            return ""
+        """Extract domain (lower-cased netloc) from URL"""
+        match = NETLOC_RE.match(url)
+        return match.group(1).lower() if match else ""
+
+class AdmissionController:
+    """Concurrency limiter whose limit can be changed while tasks are waiting"""
+    
+    def __init__(self, limit=50):
+        self._active = 0
+        self._limit = limit
+        self._cond = asyncio.Condition()
+    
+    @property
+    def limit(self) -> int:
+        return self._limit
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    async def acquire(self):
+        """Wait for a free slot and take it"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self._limit)
+            self._active += 1
+    
+    async def release(self):
+        """Give a slot back and wake one waiter"""
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify(1)
+    
+    async def set_limit(self, limit: int):
+        """Resize the limit; lowering it lets running tasks finish and holds back new ones"""
+        async with self._cond:
+            raised = limit > self._limit
+            self._limit = limit
+            if raised:
+                self._cond.notify_all()
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
 
 class RateLimiter:
     """Rate limiting for requests"""
@@ -130,25 +232,25 @@ class RateLimiter:
     def __init__(self, rate_limit=10, per_second=1):
         self.rate_limit = rate_limit
         self.per_second = per_second
+        self._refill = rate_limit / per_second  # tokens added per second
         self._tokens = rate_limit
-        self._last_update = time.time()
-        self._lock = asyncio.Lock()
+        self._last_update = time.monotonic()
     
     async def acquire(self):
-        """Acquire token for making request"""
-        async with self._lock:
-            now = time.time()
-            time_passed = now - self._last_update
-            self._tokens = min(
-                self.rate_limit,
-                self._tokens + time_passed * (self.rate_limit / self.per_second)
-            )
-            self._last_update = now
-            
-            if self._tokens >= 1:
-                self._tokens -= 1
-                return True
-            
-            await asyncio.sleep((1 - self._tokens) / (self.rate_limit / self.per_second))
-            self._tokens -= 1
-            return True
+        """Acquire token for making request
+
+        The bucket update has no await in it, so it cannot interleave with other
+        coroutines and needs no lock. A token is always reserved; a negative
+        balance is the debt the caller sleeps off, outside of any critical section.
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            self.rate_limit,
+            self._tokens + (now - self._last_update) * self._refill
+        ) - 1
+        self._last_update = now
+        
+        delay = max(0.0, -self._tokens) / self._refill
+        if delay:
+            await asyncio.sleep(delay)
+        return True
@@ -1,22 +1,89 @@
+import os
+import queue
+import shutil
+import tempfile
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 import logging
 
+SHM_DIR = '/dev/shm'
+
+# Requests Chrome drops at the network layer; none of them carry crawlable text.
+# Trackers are matched by host so first-party paths such as /analytics-guide still load.
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.css', '*.mp4', '*.webm',
+    '*://*google-analytics.com/*', '*://*googletagmanager.com/*', '*://*doubleclick.net/*'
+]
+
+def block_heavy_resources(driver):
+    """Block images, fonts, styles, media and trackers before any bytes are fetched"""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Could not set blocked URLs: {e}")
+
+# Records the time of the last DOM mutation in window.__lastMutation
+WATCH_MUTATIONS_JS = """
+window.__lastMutation = Date.now();
+if (!window.__mutationWatcher && document.body) {
+    window.__mutationWatcher = new MutationObserver(function () { window.__lastMutation = Date.now(); });
+    window.__mutationWatcher.observe(document.body, {childList: true, subtree: true});
+}
+"""
+
+def watch_dom_mutations(driver):
+    """Start tracking DOM mutations on the current page (call before scrolling/clicking)"""
+    driver.execute_script(WATCH_MUTATIONS_JS)
+
+def wait_for_dom_settle(driver, timeout=2, quiet_period=0.3):
+    """Wait until the page has had no DOM mutations for quiet_period seconds
+
+    Returns as soon as the page is quiet instead of sleeping a fixed time;
+    gives up silently after timeout seconds. Requires watch_dom_mutations().
+    """
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script("return Date.now() - (window.__lastMutation || 0)") >= quiet_period * 1000
+        )
+    except TimeoutException:
+        pass
+
 class WebDriverPool:
     """Thread-safe pool of reusable WebDriver instances"""
     
-    def __init__(self, max_drivers=5, headless=True):
+    def __init__(self, max_drivers=5, headless=True, prewarm=False, driver_factory=None):
         self.max_drivers = max_drivers
         self.headless = headless
+        # Optional callable returning a new driver, for callers that need other browser settings
+        self.driver_factory = driver_factory
         self._drivers = []
+        # Drivers handed out by get_driver and not yet returned or discarded
+        self._checked_out = set()
+        self._created = 0
+        self._profile_dirs = []
+        # Guards _drivers/_checked_out/_created and hand-offs through the queue
         self._lock = threading.Lock()
-        self._available = []
+        # Signalled whenever a driver is returned or a slot is freed
+        self._available = threading.Condition(self._lock)
+        # LIFO so the most recently used (warm) driver is handed out first
+        self._pool = queue.LifoQueue(maxsize=max_drivers)
         self.logger = logging.getLogger(__name__)
         
+        if prewarm:
+            self.prewarm()
+        
     def _create_driver(self):
         """Create a new WebDriver instance with optimized settings"""
+        if self.driver_factory is not None:
+            return self.driver_factory()
+        
         options = Options()
         
         if self.headless:
@@ -31,36 +98,124 @@ class WebDriverPool:
         options.add_argument('--disable-images')
         options.add_argument('--disable-javascript')
         options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--disable-features=Translate,BackForwardCache,OptimizationHints,MediaRouter')
+        options.add_argument('--no-first-run')
+        options.add_argument('--no-default-browser-check')
+        # Content-setting block; the command-line image flags are not honoured by every build
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
         
-        # Page load strategy
-        caps = DesiredCapabilities().CHROME
-        caps["pageLoadStrategy"] = "eager"  # Don't wait for full page load
+        # Page load strategy (W3C capability, set via Options)
+        options.page_load_strategy = 'eager'  # Don't wait for full page load
         
-        driver = webdriver.Chrome(options=options, desired_capabilities=caps)
+        # Keep each profile and its cache in RAM (tmpfs) rather than on disk
+        profile_dir = tempfile.mkdtemp(prefix='scraper-chrome-', dir=SHM_DIR if os.path.isdir(SHM_DIR) else None)
+        self._profile_dirs.append(profile_dir)
+        options.add_argument(f'--user-data-dir={profile_dir}')
+        options.add_argument('--disk-cache-size=1')
+        options.add_argument('--media-cache-size=1')
+        
+        driver = webdriver.Chrome(options=options)
+        block_heavy_resources(driver)
         driver.set_page_load_timeout(30)
         driver.implicitly_wait(5)
         
         return driver
     
-    def get_driver(self):
-        """Get an available driver from the pool"""
+    def prewarm(self):
+        """Launch the remaining drivers concurrently so cold start is paid once"""
         with self._lock:
-            if self._available:
-                return self._available.pop()
-            
-            if len(self._drivers) < self.max_drivers:
-                driver = self._create_driver()
+            count = self.max_drivers - self._created
+            self._created += count
+        if count <= 0:
+            return
+        
+        def create(_):
+            try:
+                return self._create_driver()
+            except Exception as e:
+                self.logger.warning(f"Failed to pre-warm WebDriver: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            drivers = list(executor.map(create, range(count)))
+        
+        with self._available:
+            for driver in drivers:
+                if driver is None:
+                    self._created -= 1
+                    continue
                 self._drivers.append(driver)
-                return driver
-            
-            # Wait for available driver
-            return None
+                self._pool.put_nowait(driver)
+            self._available.notify_all()
     
-    def return_driver(self, driver):
-        """Return a driver to the pool"""
+    def get_driver(self, timeout=30):
+        """Get an available driver from the pool
+
+        Creates a new driver while the pool is below max_drivers, otherwise
+        blocks until one is returned or a discarded one frees its slot.
+        Returns None after ``timeout`` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self._available:
+            while True:
+                try:
+                    driver = self._pool.get_nowait()
+                except queue.Empty:
+                    pass
+                else:
+                    self._checked_out.add(driver)
+                    return driver
+                if self._created < self.max_drivers:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.logger.warning(f"No WebDriver became available within {timeout}s")
+                    return None
+                self._available.wait(remaining)
+        
+        # Launching Chrome is slow, so it happens outside the lock
+        try:
+            driver = self._create_driver()
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
         with self._lock:
+            self._drivers.append(driver)
+            self._checked_out.add(driver)
+        return driver
+    
+    def return_driver(self, driver):
+        """Return a driver to the pool
+
+        Ignores None and drivers that are not currently checked out from this
+        pool, so a double return cannot put the same driver in the queue twice.
+        """
+        if driver is None:
+            return
+        with self._available:
+            if driver not in self._checked_out:
+                self.logger.warning("Ignoring a WebDriver that was not checked out from this pool")
+                return
+            self._checked_out.discard(driver)
+            self._pool.put_nowait(driver)
+            self._available.notify()
+    
+    def discard_driver(self, driver):
+        """Quit a broken driver instead of returning it; frees its slot for a new one"""
+        try:
+            driver.quit()
+        except:
+            pass
+        with self._available:
+            self._checked_out.discard(driver)
             if driver in self._drivers:
-                self._available.append(driver)
+                self._drivers.remove(driver)
+                self._created -= 1
+                # A waiter in get_driver can now start a replacement
+                self._available.notify()
     
     def close_all(self):
         """Close all drivers in the pool"""
@@ -71,4 +226,13 @@ class WebDriverPool:
                 except:
                     pass
             self._drivers.clear()
-            self._available.clear()
+            self._checked_out.clear()
+            self._created = 0
+            for profile_dir in self._profile_dirs:
+                shutil.rmtree(profile_dir, ignore_errors=True)
+            self._profile_dirs.clear()
+            while True:
+                try:
+                    self._pool.get_nowait()
+                except queue.Empty:
+                    break
@@ -1,12 +1,18 @@
+import asyncio
 import logging
 import time
 import re
 import json
+import sys
 import threading
-from urllib.parse import urlparse, urljoin, parse_qs
-from collections import defaultdict, deque
+import heapq
+import itertools
+from functools import lru_cache
+from urllib.parse import urlparse, urljoin, parse_qs, parse_qsl, urlencode, urlunparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import xml.etree.ElementTree as ET
+from lxml import etree, html as lxml_html
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -14,31 +20,195 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
-from bs4 import BeautifulSoup
 import requests
+from requests.compat import chardet
+import orjson
+
+from .page_store import PageStore
+from .sitemap import iter_sitemap_locs
+from .async_requests import AsyncHTTPClient, MAX_PAGE_SIZE, READ_CHUNK_SIZE
+from .driver_pool import block_heavy_resources, watch_dom_mutations, wait_for_dom_settle
 
 logger = logging.getLogger('scraper')
 
+# Upper bound on what a single sitemap download may feed the parser
+MAX_SITEMAP_SIZE = 64 * 1024 * 1024  # 64 MB
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Every link-bearing attribute flood_fill_discovery follows, gathered in one pass over the DOM
+LINK_SOURCES_XPATH = etree.XPath(
+    '//a/@href | //link/@href | //area/@href | //base/@href | //form/@action'
+    ' | //iframe/@src | //frame/@src | //object/@data | //embed/@src'
+    ' | //script/@src | //img/@src | //@data-url | //@data-href | //@data-link'
+)
+# analyze_page_structure lookups
+META_DESCRIPTION_XPATH = etree.XPath('//meta[@name="description"]/@content')
+HEADINGS_XPATH = etree.XPath('//h1 | //h2 | //h3 | //h4 | //h5 | //h6')
+ANCHOR_HREFS_XPATH = etree.XPath('//a/@href')
+FORMS_XPATH = etree.XPath('//form')
+FORM_INPUTS_XPATH = etree.XPath('.//input | .//textarea | .//select')
+RESOURCES_XPATH = etree.XPath(
+    '//img[@src] | //script[@src]'
+    ' | //link[@href][contains(concat(" ", normalize-space(@rel), " "), " stylesheet ")]'
+)
+# extract_content: content elements outside boilerplate, and their visible text
+_BOILERPLATE = ('ancestor-or-self::script or ancestor-or-self::style or ancestor-or-self::nav'
+                ' or ancestor-or-self::header or ancestor-or-self::footer or ancestor-or-self::aside')
+CONTENT_XPATH = etree.XPath(
+    '(//h1 | //h2 | //h3 | //h4 | //h5 | //h6 | //p | //div | //span | //article | //section'
+    ' | //li | //td | //th | //blockquote)[not(' + _BOILERPLATE + ')]'
+)
+CONTENT_TEXT_XPATH = etree.XPath('.//text()[not(' + _BOILERPLATE + ')]')
+# Client-rendered app shells whose static HTML carries no content
+JS_APP_MARKERS_RE = re.compile(
+    r'__NEXT_DATA__|__NUXT__|data-reactroot|ng-version=|<div id="(?:root|app)">\s*</div>',
+    re.IGNORECASE
+)
+BODY_TEXT_XPATH = etree.XPath('//body//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]')
+# "Sitemap:" directives in robots.txt, matched case-insensitively without lower-casing each line
+ROBOTS_SITEMAP_RE = re.compile(r'^[ \t]*sitemap:[ \t]*(\S+)', re.IGNORECASE | re.MULTILINE)
+# Static assets and documents that are never crawled as pages
+_EXT_RE = re.compile(r'\.(?:pdf|jpe?g|png|gif|css|js|svg|ico|woff2?)$', re.IGNORECASE)
+SCRIPT_TEXT_XPATH = etree.XPath('//script/text()')
+# Quoted page paths inside inline scripts; bounded length keeps the scan linear
+SCRIPT_LINK_RE = re.compile(r'[\'"]([^\'"\s]{1,512}\.(?:html|php|aspx?|jsp))[\'"]', re.IGNORECASE)
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = frozenset(['gclid', 'fbclid', 'msclkid', 'dclid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl'])
+
+def canonicalize_url(url):
+    """Collapse URL variants that serve the same page onto one key
+
+    Lower-cases scheme and host, drops the fragment and tracking parameters
+    (utm_* and TRACKING_PARAMS) and sorts the remaining query.
+    """
+    parsed = urlparse(url)
+    query = parsed.query
+    if query:
+        params = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+                  if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS]
+        query = urlencode(sorted(params))
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or '/',
+                       parsed.params, query, ''))
+
+# page_source is already decoded; an explicit parser encoding lets lxml take documents
+# that still carry an XML/charset declaration
+UTF8_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+
+# charset=... in a Content-Type header or a <meta> tag
+CHARSET_RE = re.compile(rb'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+def decode_html(body, content_type=''):
+    """Decode fetched HTML with the charset the server or the page declares
+
+    Falls back to detecting the encoding when neither names one; requests
+    would assume ISO-8859-1 for any text/html response without a charset.
+    """
+    match = CHARSET_RE.search(content_type.encode('latin-1')) or CHARSET_RE.search(body[:2048])
+    encoding = match.group(1).decode('ascii') if match else chardet.detect(body)['encoding']
+    try:
+        return body.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+def parse_html(page_source):
+    """Parse decoded page source into an lxml.html tree"""
+    return lxml_html.fromstring(page_source.encode('utf-8'), parser=UTF8_HTML_PARSER)
+
+def needs_javascript(page_source, min_words=50):
+    """Guess whether a statically fetched page only renders its content in a browser"""
+    if JS_APP_MARKERS_RE.search(page_source):
+        return True
+    try:
+        tree = parse_html(page_source)
+    except (etree.ParserError, ValueError):
+        return True
+    words = 0
+    for text in BODY_TEXT_XPATH(tree):
+        words += len(text.split())
+        if words >= min_words:
+            return False
+    return True
+
+class CappedReader:
+    """File-like wrapper that reports EOF once ``limit`` bytes have been read"""
+    
+    def __init__(self, raw, limit, url=''):
+        self.raw = raw
+        self.remaining = limit
+        self.url = url
+    
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            logger.warning("Stopped reading %s at the size limit", self.url)
+            self.url = ''  # warn once
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.raw.read(size)
+        self.remaining -= len(data)
+        return data
+
+def node_text(element):
+    """Whitespace-normalised text content of an lxml element"""
+    return ' '.join(element.text_content().split())
+
+def fast_urljoin(base_url, base_parsed, ref):
+    """urljoin with shortcuts for absolute and root-relative links (most hrefs on a page)"""
+    if ref.startswith(('http://', 'https://')):
+        return ref
+    if ref.startswith('/') and not ref.startswith('//') and '/.' not in ref:
+        return f"{base_parsed.scheme}://{base_parsed.netloc}{ref}"
+    return urljoin(base_url, ref)
+
+@lru_cache(maxsize=65536)
+def _is_crawlable_url(url, base_netloc):
+    """Memoised check behind EnhancedWebCrawler.is_valid_url; the same links recur on every page"""
+    try:
+        parsed = urlparse(url)
+        return (parsed.scheme in ('http', 'https') and
+                parsed.netloc.lower() == base_netloc and
+                not _EXT_RE.search(parsed.path))
+    except:
+        return False
+
 class EnhancedWebCrawler:
-    def __init__(self, base_url, max_depth=10, max_pages=1000):
+    def __init__(self, base_url, max_depth=10, max_pages=1000, fetch_workers=8, pages_path=None,
+                 enable_param_fuzzing=False, page_store=None):
         self.base_url = base_url
-        self.base_netloc = urlparse(base_url).netloc
+        # Interned so the per-URL host comparison is usually an identity check
+        self.base_netloc = sys.intern(urlparse(base_url).netloc.lower())
         self.max_depth = max_depth
         self.max_pages = max_pages
+        self.fetch_workers = fetch_workers
+        # Guessing ?page=1, ?id=1, ... on every page mostly yields 404s and duplicates
+        self.enable_param_fuzzing = enable_param_fuzzing
+        
+        # When set, each page's analysis is appended to this NDJSON file as it is
+        # crawled instead of being kept in site_map
+        self.pages_path = pages_path
+        self._pages_file = None
+        # Or persisted to a PageStore (SQLite), keyed by URL
+        self.page_store = page_store
         
         # Data structures for comprehensive mapping
         self.site_map = defaultdict(dict)
         self.page_relationships = defaultdict(set)
         self.discovered_urls = set()
+        # canonicalize_url() of every discovered URL, so tracking/fragment variants are
+        # crawled once; the URL itself is what gets fetched and reported
+        self._discovered_keys = set()
         self.crawled_urls = set()
         self.failed_urls = set()
         self.external_links = defaultdict(set)
         self.resource_links = defaultdict(set)
         
         # Enhanced crawling queues
-        self.priority_queue = deque()  # High priority URLs
-        self.normal_queue = deque()    # Normal priority URLs
-        self.flood_fill_queue = deque() # URLs discovered through flood-fill
+        # Single frontier heap of (score, order, url, depth); lower scores are crawled first
+        self.frontier = []
+        self._frontier_order = itertools.count()
+        self._seen_sections = set()  # first path segments already queued
         
         # Statistics
         self.stats = {
@@ -50,6 +220,10 @@ class EnhancedWebCrawler:
             'js_discovered': 0
         }
         
+        # Plain HTTP session for pages that do not need a browser to render
+        self.http = requests.Session()
+        self.http.headers['User-Agent'] = USER_AGENT
+        
         self.driver = None
         self.setup_driver()
     
@@ -61,7 +235,7 @@ class EnhancedWebCrawler:
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-gpu')
         options.add_argument('--window-size=1920,1080')
-        options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+        options.add_argument(f'--user-agent={USER_AGENT}')
         
         # Enable JavaScript execution logging
         options.add_experimental_option('prefs', {
@@ -69,6 +243,7 @@ class EnhancedWebCrawler:
         })
         
         self.driver = webdriver.Chrome(options=options)
+        block_heavy_resources(self.driver)
         self.driver.set_page_load_timeout(30)
     
     def discover_initial_urls(self):
@@ -78,200 +253,192 @@ class EnhancedWebCrawler:
         # 1. Start with base URL
         discovered.add(self.base_url)
         
-        # 2. Check for sitemap.xml
-        sitemap_url = urljoin(self.base_url, '/sitemap.xml')
-        try:
-            response = requests.get(sitemap_url, timeout=10)
-            if response.status_code == 200:
-                discovered.update(self.parse_sitemap(response.text))
-        except Exception as e:
-            logger.info(f"No sitemap.xml found at {sitemap_url}")
+        # 2-4. Sitemap, robots.txt and common locations are independent; probe them concurrently
+        discovered.update(asyncio.run(self._probe_initial_urls()))
         
-        # 3. Check for robots.txt (for discovery, not restriction)
-        robots_url = urljoin(self.base_url, '/robots.txt')
+        return discovered
+    
+    def _fetch_sitemap_urls(self, sitemap_url):
+        """Stream sitemap.xml through parse_sitemap (blocking; run in a worker thread)"""
         try:
-            response = requests.get(robots_url, timeout=10)
-            if response.status_code == 200:
-                discovered.update(self.parse_robots_txt(response.text))
+            with requests.get(sitemap_url, timeout=10, stream=True) as response:
+                if response.status_code == 200:
+                    # Let urllib3 undo any Content-Encoding while lxml reads the stream
+                    response.raw.decode_content = True
+                    return self.parse_sitemap(CappedReader(response.raw, MAX_SITEMAP_SIZE, sitemap_url))
         except Exception as e:
-            logger.info(f"No robots.txt found at {robots_url}")
-        
-        # 4. Check common locations
+            logger.info("No sitemap.xml found at %s", sitemap_url)
+        return set()
+    
+    async def _probe_initial_urls(self):
+        discovered = set()
+        sitemap_url = urljoin(self.base_url, '/sitemap.xml')
+        # robots.txt is read for discovery, not restriction
+        robots_url = urljoin(self.base_url, '/robots.txt')
         common_paths = [
             '/sitemap_index.xml', '/post-sitemap.xml', '/page-sitemap.xml',
             '/category-sitemap.xml', '/tag-sitemap.xml', '/author-sitemap.xml',
             '/rss', '/feed', '/rss.xml', '/atom.xml', '/feed.xml'
         ]
+        common_urls = [urljoin(self.base_url, path) for path in common_paths]
         
-        for path in common_paths:
-            full_url = urljoin(self.base_url, path)
-            try:
-                response = requests.head(full_url, timeout=5)
-                if response.status_code == 200:
-                    discovered.add(full_url)
-            except:
-                pass
+        async with AsyncHTTPClient(max_connections=len(common_urls) + 1, timeout=10) as client:
+            sitemap_urls, robots_content, *statuses = await asyncio.gather(
+                asyncio.to_thread(self._fetch_sitemap_urls, sitemap_url),
+                client.fetch_url(robots_url),
+                *[client.check_url_status(url) for url in common_urls]
+            )
         
+        discovered.update(sitemap_urls)
+        if robots_content:
+            discovered.update(self.parse_robots_txt(robots_content))
+        else:
+            logger.info("No robots.txt found at %s", robots_url)
+        discovered.update(url for url, ok in zip(common_urls, statuses) if ok)
         return discovered
     
-    def parse_sitemap(self, sitemap_content):
-        """Parse sitemap XML to extract URLs"""
+    def parse_sitemap(self, sitemap_stream):
+        """Parse sitemap XML to extract URLs
+
+        Streams <loc> elements with iterparse and frees each entry once read,
+        so memory stays flat however large the sitemap is.
+        """
         urls = set()
         try:
-            root = ET.fromstring(sitemap_content)
             # Handle both sitemap and sitemapindex formats
-            for url in root.iter():
-                if url.tag.endswith('url') or url.tag.endswith('loc'):
-                    if url.text and self.is_valid_url(url.text):
-                        urls.add(url.text)
+            for url in iter_sitemap_locs(sitemap_stream):
+                if url and self.is_valid_url(url):
+                    urls.add(url)
         except Exception as e:
-            logger.error(f"Error parsing sitemap: {e}")
+            logger.error("Error parsing sitemap: %s", e)
         return urls
     
     def parse_robots_txt(self, robots_content):
         """Parse robots.txt to discover sitemaps and allowed paths"""
         urls = set()
-        lines = robots_content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.lower().startswith('sitemap:'):
-                sitemap_url = line.split(':', 1)[1].strip()
-                if self.is_valid_url(sitemap_url):
-                    urls.add(sitemap_url)
+        for sitemap_url in ROBOTS_SITEMAP_RE.findall(robots_content):
+            if self.is_valid_url(sitemap_url):
+                urls.add(sitemap_url)
         return urls
     
     def is_valid_url(self, url):
         """Check if URL is valid and belongs to the target domain"""
-        try:
-            parsed = urlparse(url)
-            return (parsed.scheme in ('http', 'https') and 
-                    parsed.netloc == self.base_netloc and
-                    not any(ext in parsed.path.lower() for ext in ['.pdf', '.jpg', '.png', '.gif', '.css', '.js']))
-        except:
-            return False
+        return _is_crawlable_url(url, self.base_netloc)
     
-    def flood_fill_discovery(self, current_url, depth):
-        """Comprehensive page discovery using flood-fill techniques"""
+    def flood_fill_discovery(self, current_url, depth, tree):
+        """Comprehensive page discovery using flood-fill techniques
+
+        ``tree`` is the lxml document parsed once by the crawl loop (the rendered
+        DOM when the page went through the browser), so discovery needs no
+        second page load or script round trip.
+        """
         discovered = set()
         
         try:
-            # Load page with enhanced JavaScript execution
-            self.driver.get(current_url)
-            time.sleep(2)
-            
-            # Execute comprehensive JavaScript discovery
-            js_discovery_script = """
-            var discovered = {
-                links: [],
-                forms: [],
-                resources: [],
-                dynamic_content: []
-            };
-            
-            // Discover all anchor links
-            var links = document.querySelectorAll('a[href]');
-            for(var i = 0; i < links.length; i++) {
-                discovered.links.push(links[i].href);
-            }
-            
-            // Discover form actions
-            var forms = document.querySelectorAll('form[action]');
-            for(var i = 0; i < forms.length; i++) {
-                discovered.forms.push(forms[i].action);
-            }
-            
-            // Discover resources
-            var resources = document.querySelectorAll('link[href], script[src], img[src]');
-            for(var i = 0; i < resources.length; i++) {
-                discovered.resources.push(resources[i].href || resources[i].src);
-            }
-            
-            // Discover dynamic content URLs
-            var elements = document.querySelectorAll('[data-url], [data-href], [data-link]');
-            for(var i = 0; i < elements.length; i++) {
-                var url = elements[i].getAttribute('data-url') || 
-                         elements[i].getAttribute('data-href') || 
-                         elements[i].getAttribute('data-link');
-                if(url) discovered.dynamic_content.push(url);
-            }
-            
-            // Discover JavaScript-generated links
-            var scripts = document.querySelectorAll('script');
-            for(var i = 0; i < scripts.length; i++) {
-                var matches = scripts[i].textContent.match(/['"]([^'"]*\\.(html|php|asp|jsp))['"]/gi);
-                if(matches) {
-                    discovered.resources = discovered.resources.concat(matches.map(m => m.slice(1, -1)));
-                }
-            }
-            
-            return discovered;
-            """
-            
-            discovered_data = self.driver.execute_script(js_discovery_script)
+            current_parsed = urlparse(current_url)
             
-            # Process discovered URLs
-            for url_list in discovered_data.values():
-                for url in url_list:
-                    full_url = urljoin(current_url, url)
-                    if self.is_valid_url(full_url) and full_url not in self.crawled_urls:
+            # Discover links from various sources (anchors cover pagination links too)
+            for url in LINK_SOURCES_XPATH(tree):
+                if url:
+                    full_url = fast_urljoin(current_url, current_parsed, url)
+                    if self.is_valid_url(full_url):
                         discovered.add(full_url)
             
-            # Enhanced link discovery through DOM traversal
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            
-            # Discover links from various sources
-            link_sources = [
-                ('a', 'href'),
-                ('link', 'href'),
-                ('area', 'href'),
-                ('base', 'href'),
-                ('form', 'action'),
-                ('iframe', 'src'),
-                ('frame', 'src'),
-                ('object', 'data'),
-                ('embed', 'src')
-            ]
-            
-            for tag, attr in link_sources:
-                elements = soup.find_all(tag, attrs={attr: True})
-                for element in elements:
-                    url = element.get(attr)
-                    if url:
-                        full_url = urljoin(current_url, url)
-                        if self.is_valid_url(full_url):
-                            discovered.add(full_url)
-            
-            # Discover parameterized URLs
-            current_parsed = urlparse(current_url)
-            common_params = ['page', 'p', 'id', 'cat', 'tag', 'author', 's', 'search']
-            for param in common_params:
-                test_url = f"{current_url}{'&' if '?' in current_url else '?'}{param}=1"
-                discovered.add(test_url)
+            # Discover JavaScript-generated links with one scan over all inline script text
+            for url in SCRIPT_LINK_RE.findall('\n'.join(SCRIPT_TEXT_XPATH(tree))):
+                full_url = fast_urljoin(current_url, current_parsed, url)
+                if self.is_valid_url(full_url):
+                    discovered.add(full_url)
             
-            # Discover pagination
-            pagination_selectors = ['.pagination a', '.pager a', '.page-numbers a', 'nav a']
-            for selector in pagination_selectors:
-                elements = soup.select(selector)
-                for element in elements:
-                    href = element.get('href')
-                    if href:
-                        full_url = urljoin(current_url, href)
-                        if self.is_valid_url(full_url):
-                            discovered.add(full_url)
+            # Discover parameterized URLs (opt-in)
+            if self.enable_param_fuzzing:
+                common_params = ['page', 'p', 'id', 'cat', 'tag', 'author', 's', 'search']
+                prefix = current_url + ('&' if '?' in current_url else '?')
+                for param in common_params:
+                    discovered.add(prefix + param + '=1')
             
         except Exception as e:
-            logger.error(f"Error in flood-fill discovery for {current_url}: {e}")
+            logger.error("Error in flood-fill discovery for %s: %s", current_url, e)
         
         return discovered
     
-    def analyze_page_structure(self, url, soup):
-        """Analyze page structure and extract metadata"""
+    def _discover(self, url):
+        """Record a discovered URL; False if a variant of it was already seen"""
+        key = canonicalize_url(url)
+        if key in self._discovered_keys:
+            return False
+        self._discovered_keys.add(key)
+        self.discovered_urls.add(url)
+        return True
+    
+    def enqueue(self, url, depth, from_sitemap=False):
+        """Push a URL onto the frontier
+
+        Shallow pages, sitemap/robots entries and the first URL seen in a new
+        site section score lower (crawl sooner); long query strings score higher.
+        """
+        parsed = urlparse(url)
+        section = parsed.path.lstrip('/').split('/', 1)[0]
+        new_section = section not in self._seen_sections
+        if new_section:
+            self._seen_sections.add(section)
+        query_params = parsed.query.count('&') + 1 if parsed.query else 0
+        score = depth - 10 * from_sitemap - 5 * new_section + 2 * query_params
+        heapq.heappush(self.frontier, (score, next(self._frontier_order), url, depth))
+    
+    def _next_batch(self, size):
+        """Pop up to ``size`` crawlable URLs from the frontier, best score first"""
+        batch = []
+        queued = set()
+        while len(batch) < size and self.frontier:
+            _, _, current_url, depth = heapq.heappop(self.frontier)
+            
+            if current_url in self.crawled_urls or current_url in queued or depth > self.max_depth:
+                continue
+            
+            # Check robots.txt before crawling
+            if not self.is_allowed_by_robots(current_url):
+                logger.info("Skipping %s - disallowed by robots.txt", current_url)
+                continue
+            
+            queued.add(current_url)
+            batch.append((current_url, depth))
+        return batch
+    
+    def fetch_static(self, url):
+        """Fetch a page over plain HTTP; None if it needs the browser instead"""
+        try:
+            with self.http.get(url, timeout=10, stream=True) as response:
+                # Headers decide before any of the body is downloaded
+                content_type = response.headers.get('Content-Type', '')
+                if response.status_code != 200 or 'html' not in content_type:
+                    return None
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(READ_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_PAGE_SIZE:
+                        logger.warning("Page size too large, skipping: %s", url)
+                        return None
+                    chunks.append(chunk)
+                page_source = decode_html(b''.join(chunks), content_type)
+        except requests.RequestException as e:
+            logger.debug("Static fetch failed for %s: %s", url, e)
+            return None
+        if needs_javascript(page_source):
+            return None
+        return page_source
+    
+    def analyze_page_structure(self, url, tree):
+        """Analyze page structure and extract metadata from the page's lxml tree"""
         page_data = {
             'url': url,
             'title': '',
             'meta_description': '',
             'headings': defaultdict(list),
-            'links': [],
+            # Hrefs partitioned at extraction time, so counts are plain len() calls
+            'internal_links': [],
+            'external_links': [],
             'forms': [],
             'images': [],
             'scripts': [],
@@ -282,40 +449,38 @@ class EnhancedWebCrawler:
         
         try:
             # Extract basic metadata
-            if soup.title:
-                page_data['title'] = soup.title.string.strip()
+            title = tree.findtext('.//title')
+            if title:
+                page_data['title'] = title.strip()
             
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
+            meta_desc = META_DESCRIPTION_XPATH(tree)
             if meta_desc:
-                page_data['meta_description'] = meta_desc.get('content', '')
+                page_data['meta_description'] = meta_desc[0]
             
-            # Extract headings
-            for level in range(1, 7):
-                headings = soup.find_all(f'h{level}')
-                for heading in headings:
-                    text = heading.get_text(strip=True)
-                    if text:
-                        page_data['headings'][f'h{level}'].append(text)
+            # Extract headings (all six levels in one document-order pass)
+            for heading in HEADINGS_XPATH(tree):
+                text = node_text(heading)
+                if text:
+                    page_data['headings'][heading.tag].append(text)
             
             # Extract links
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                text = link.get_text(strip=True)
+            internal_links = page_data['internal_links']
+            external_links = page_data['external_links']
+            for href in ANCHOR_HREFS_XPATH(tree):
                 full_url = urljoin(url, href)
-                page_data['links'].append({
-                    'url': full_url,
-                    'text': text,
-                    'internal': self.is_valid_url(full_url)
-                })
+                if self.is_valid_url(full_url):
+                    internal_links.append(full_url)
+                else:
+                    external_links.append(full_url)
             
             # Extract forms
-            for form in soup.find_all('form'):
+            for form in FORMS_XPATH(tree):
                 form_data = {
                     'action': form.get('action', ''),
                     'method': form.get('method', 'get'),
                     'inputs': []
                 }
-                for input_tag in form.find_all(['input', 'textarea', 'select']):
+                for input_tag in FORM_INPUTS_XPATH(form):
                     input_data = {
                         'type': input_tag.get('type', 'text'),
                         'name': input_tag.get('name', ''),
@@ -324,21 +489,20 @@ class EnhancedWebCrawler:
                     form_data['inputs'].append(input_data)
                 page_data['forms'].append(form_data)
             
-            # Extract resources
-            for img in soup.find_all('img', src=True):
-                page_data['images'].append({
-                    'src': urljoin(url, img['src']),
-                    'alt': img.get('alt', '')
-                })
-            
-            for script in soup.find_all('script', src=True):
-                page_data['scripts'].append(urljoin(url, script['src']))
-            
-            for css in soup.find_all('link', rel='stylesheet', href=True):
-                page_data['stylesheets'].append(urljoin(url, css['href']))
+            # Extract resources (images, scripts and stylesheets in one pass)
+            for resource in RESOURCES_XPATH(tree):
+                if resource.tag == 'img':
+                    page_data['images'].append({
+                        'src': urljoin(url, resource.get('src')),
+                        'alt': resource.get('alt', '')
+                    })
+                elif resource.tag == 'script':
+                    page_data['scripts'].append(urljoin(url, resource.get('src')))
+                else:
+                    page_data['stylesheets'].append(urljoin(url, resource.get('href')))
                 
         except Exception as e:
-            logger.error(f"Error analyzing page structure for {url}: {e}")
+            logger.error("Error analyzing page structure for %s: %s", url, e)
         
         return page_data
     
@@ -352,127 +516,135 @@ class EnhancedWebCrawler:
         # Initial URL discovery
         initial_urls = self.discover_initial_urls()
         for url in initial_urls:
-            if self.is_allowed_by_robots(url):
-                self.normal_queue.append((url, 0))
-                self.discovered_urls.add(url)
+            if self.is_allowed_by_robots(url) and self._discover(url):
+                self.enqueue(url, 0, from_sitemap=True)
         
         crawl_count = 0
         
-        while (self.priority_queue or self.normal_queue or self.flood_fill_queue) and crawl_count < self.max_pages:
-            # Priority queue first, then normal, then flood-fill
-            if self.priority_queue:
-                current_url, depth = self.priority_queue.popleft()
-            elif self.normal_queue:
-                current_url, depth = self.normal_queue.popleft()
-            elif self.flood_fill_queue:
-                current_url, depth = self.flood_fill_queue.popleft()
-            else:
-                break
-            
-            if current_url in self.crawled_urls or depth > self.max_depth:
-                continue
-            
-            # Check robots.txt before crawling
-            if not self.is_allowed_by_robots(current_url):
-                logger.info(f"Skipping {current_url} - disallowed by robots.txt")
-                continue
-            
-            logger.info(f"Crawling: {current_url} (Depth: {depth})")
-            
-            try:
-                start_time = time.time()
-                self.driver.get(current_url)
-                
-                # Wait for page load
-                WebDriverWait(self.driver, 10).until(
-                    lambda d: d.execute_script("return document.readyState") == "complete"
-                )
-                
-                # Scroll to load dynamic content
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-                
-                page_source = self.driver.page_source
-                soup = BeautifulSoup(page_source, 'html.parser')
-                
-                # Analyze page structure
-                page_data = self.analyze_page_structure(current_url, soup)
-                self.site_map[current_url] = page_data
-                
-                # Extract content for storage
-                content = self.extract_content(soup, current_url)
-                
-                # Flood-fill discovery
-                new_urls = self.flood_fill_discovery(current_url, depth)
-                
-                # Add new URLs to appropriate queues
-                for new_url in new_urls:
-                    if new_url not in self.discovered_urls:
-                        self.discovered_urls.add(new_url)
-                        if depth < 3:  # Higher priority for shallow depths
-                            self.priority_queue.append((new_url, depth + 1))
-                        else:
-                            self.flood_fill_queue.append((new_url, depth + 1))
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            while self.frontier and crawl_count < self.max_pages:
+                batch = self._next_batch(min(self.fetch_workers, self.max_pages - crawl_count))
+                if not batch:
+                    continue
                 
-                self.crawled_urls.add(current_url)
-                crawl_count += 1
+                # Fetch the batch concurrently; parsing, analysis and queueing stay on this thread
+                static_pages = executor.map(self.fetch_static, [url for url, _ in batch])
                 
-                # Update statistics
-                self.stats['total_pages'] = len(self.crawled_urls)
-                self.stats['total_links'] += len(page_data['links'])
-                self.stats['external_links'] += len([l for l in page_data['links'] if not l['internal']])
-                self.stats['resources_found'] += len(page_data['images']) + len(page_data['scripts']) + len(page_data['stylesheets'])
-                self.stats['forms_found'] += len(page_data['forms'])
-                
-                logger.info(f"Successfully crawled {current_url} - Stats: {self.stats}")
-                
-            except Exception as e:
-                logger.error(f"Error crawling {current_url}: {e}")
-                self.failed_urls.add(current_url)
+                for (current_url, depth), page_source in zip(batch, static_pages):
+                    logger.info("Crawling: %s (Depth: %s)", current_url, depth)
+                    
+                    try:
+                        start_time = time.time()
+                        # Static pages came over plain HTTP; only JS-rendered ones go through Chrome
+                        if page_source is None:
+                            self.driver.get(current_url)
+                            
+                            # Wait for page load
+                            WebDriverWait(self.driver, 10).until(
+                                lambda d: d.execute_script("return document.readyState") == "complete"
+                            )
+                            
+                            # Scroll to load dynamic content, then wait until the DOM stops changing
+                            watch_dom_mutations(self.driver)
+                            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                            wait_for_dom_settle(self.driver)
+                            
+                            page_source = self.driver.page_source
+                        
+                        tree = parse_html(page_source)
+                        
+                        # Analyze page structure
+                        page_data = self.analyze_page_structure(current_url, tree)
+                        self.record_page(current_url, page_data)
+                        
+                        # Extract content for storage
+                        content = self.extract_content(tree, current_url)
+                        
+                        # Flood-fill discovery
+                        new_urls = self.flood_fill_discovery(current_url, depth, tree)
+                        
+                        # Add new URLs to the frontier
+                        for new_url in new_urls:
+                            if self._discover(new_url):
+                                self.enqueue(new_url, depth + 1)
+                        
+                        self.crawled_urls.add(current_url)
+                        crawl_count += 1
+                        
+                        # Update statistics
+                        self.stats['total_pages'] = len(self.crawled_urls)
+                        self.stats['total_links'] += len(page_data['internal_links']) + len(page_data['external_links'])
+                        self.stats['external_links'] += len(page_data['external_links'])
+                        self.stats['resources_found'] += len(page_data['images']) + len(page_data['scripts']) + len(page_data['stylesheets'])
+                        self.stats['forms_found'] += len(page_data['forms'])
+                        
+                        if logger.isEnabledFor(logging.INFO):
+                            logger.info("Successfully crawled %s - Stats: %s", current_url, self.stats)
+                    
+                    except Exception as e:
+                        logger.error("Error crawling %s: %s", current_url, e)
+                        self.failed_urls.add(current_url)
         
-        logger.info(f"Crawling completed. Total pages: {len(self.crawled_urls)}")
+        logger.info("Crawling completed. Total pages: %s", len(self.crawled_urls))
         return self.generate_site_report()
     
-    def extract_content(self, soup, url):
-        """Enhanced content extraction"""
+    def extract_content(self, tree, url):
+        """Enhanced content extraction
+
+        One XPath walk in document order; script/style/nav/header/footer/aside
+        subtrees are excluded at match time instead of being removed first, and
+        text repeated by nested containers is only kept once.
+        """
         content = []
+        seen_text = set()
         
-        # Remove unwanted elements
-        for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-            element.extract()
-        
-        # Extract content from various sources
-        content_selectors = [
-            'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-            'p', 'div', 'span', 'article', 'section',
-            'li', 'td', 'th', 'blockquote'
-        ]
-        
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                text = element.get_text(strip=True)
-                if text and len(text) > 10:
-                    content.append({
-                        'tag': selector,
-                        'text': text,
-                        'word_count': len(text.split())
-                    })
+        for element in CONTENT_XPATH(tree):
+            text = ' '.join(' '.join(CONTENT_TEXT_XPATH(element)).split())
+            if len(text) > 10:
+                text_hash = hash(text)
+                if text_hash in seen_text:
+                    continue
+                seen_text.add(text_hash)
+                content.append({
+                    'tag': element.tag,
+                    'text': text,
+                    # text is already single-space normalised
+                    'word_count': text.count(' ') + 1
+                })
         
         return content
     
+    def record_page(self, url, page_data):
+        """Keep a page's analysis in site_map, or persist it outside the process"""
+        if self.page_store is not None:
+            self.page_store.put(url, page_data)
+            return
+        if self.pages_path is None:
+            self.site_map[url] = page_data
+            return
+        if self._pages_file is None:
+            self._pages_file = open(self.pages_path, 'wb')
+        self._pages_file.write(orjson.dumps(page_data, option=orjson.OPT_APPEND_NEWLINE))
+    
     def generate_site_report(self):
         """Generate comprehensive site analysis report"""
+        if self._pages_file is not None:
+            self._pages_file.flush()
+        if self.page_store is not None:
+            self.page_store.flush()
+        site_map = dict(self.site_map)
         report = {
             'total_pages_crawled': len(self.crawled_urls),
             'total_failed_urls': len(self.failed_urls),
-            'site_structure': dict(self.site_map),
+            'site_structure': site_map,
             'external_links': dict(self.external_links),
             'resource_links': dict(self.resource_links),
             'statistics': self.stats,
             'crawl_path': list(self.crawled_urls),
             'discovered_urls': list(self.discovered_urls),
-            'failed_urls': list(self.failed_urls)
+            'failed_urls': list(self.failed_urls),
+            'pages_path': self.pages_path,
+            'page_store': self.page_store.path if self.page_store is not None else None
         }
         
         # Generate sitemap
@@ -485,25 +657,31 @@ class EnhancedWebCrawler:
         return {
             'report': report,
             'sitemap': sitemap,
-            'site_map': dict(self.site_map)
+            'site_map': site_map
         }
     
     def build_hierarchy(self):
-        """Build URL hierarchy for better understanding"""
-        hierarchy = defaultdict(list)
+        """Build URL hierarchy for better understanding
+
+        Paths are sorted so each one shares its longest prefix with the previous
+        path; a stack holding that branch means only the new levels are created.
+        """
+        hierarchy = {}
+        stack = []  # (part, node) for each level of the previous path
         
-        for url in self.crawled_urls:
-            parsed = urlparse(url)
-            path_parts = parsed.path.strip('/').split('/')
+        paths = {tuple(part for part in urlparse(url).path.split('/') if part) for url in self.crawled_urls}
+        for path_parts in sorted(paths):
+            common = 0
+            while common < len(stack) and common < len(path_parts) and stack[common][0] == path_parts[common]:
+                common += 1
+            del stack[common:]
             
-            current_level = hierarchy
-            for part in path_parts:
-                if part:
-                    if part not in current_level:
-                        current_level[part] = {}
-                    current_level = current_level[part]
+            current_level = stack[-1][1] if stack else hierarchy
+            for part in path_parts[common:]:
+                current_level = current_level.setdefault(part, {})
+                stack.append((part, current_level))
         
-        return dict(hierarchy)
+        return hierarchy
     
     def get_robot_parser(self, base_url):
         """Initialize and return robots.txt parser"""
@@ -513,10 +691,10 @@ class EnhancedWebCrawler:
         try:
             rp.set_url(robots_txt_url)
             rp.read()
-            logger.info(f"Successfully loaded robots.txt from {robots_txt_url}")
+            logger.info("Successfully loaded robots.txt from %s", robots_txt_url)
             return rp
         except Exception as e:
-            logger.warning(f"Error loading robots.txt from {robots_txt_url}: {e}")
+            logger.warning("Error loading robots.txt from %s: %s", robots_txt_url, e)
             return None
     
     def is_allowed_by_robots(self, url):
@@ -528,7 +706,7 @@ class EnhancedWebCrawler:
             user_agent = "EnhancedWebCrawler/1.0"
             return self.robots_parser.can_fetch(user_agent, url)
         except Exception as e:
-            logger.warning(f"Error checking robots.txt for {url}: {e}")
+            logger.warning("Error checking robots.txt for %s: %s", url, e)
             return True  # Allow on error
     
     def get_robots_disallowed_paths(self):
@@ -547,19 +725,30 @@ class EnhancedWebCrawler:
     
     def cleanup(self):
         """Clean up resources"""
+        if self._pages_file is not None:
+            self._pages_file.close()
+            self._pages_file = None
         if self.driver:
             try:
                 self.driver.quit()
             except Exception as e:
-                logger.error(f"Error closing driver: {e}")
+                logger.error("Error closing driver: %s", e)
 
 # Usage function
-def run_enhanced_crawl(start_url, max_depth=10, max_pages=1000):
-    """Run enhanced crawling with flood-fill discovery"""
-    crawler = EnhancedWebCrawler(start_url, max_depth, max_pages)
+def run_enhanced_crawl(start_url, max_depth=10, max_pages=1000, pages_path=None, page_store_path=None):
+    """Run enhanced crawling with flood-fill discovery
+
+    Pass pages_path to stream per-page analysis to an NDJSON file, or
+    page_store_path to persist it in a SQLite PageStore, rather than
+    returning it in the report.
+    """
+    page_store = PageStore(page_store_path) if page_store_path else None
+    crawler = EnhancedWebCrawler(start_url, max_depth, max_pages, pages_path=pages_path, page_store=page_store)
     
     try:
         results = crawler.crawl_with_flood_fill()
         return results
     finally:
         crawler.cleanup()
+        if page_store is not None:
+            page_store.close()
@@ -1,8 +1,15 @@
+import atexit
 import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 def setup_logger(name='scraper', log_file='scraper.log', level=logging.INFO):
-    """Set up a logger with file and console handlers."""
+    """Set up a logger with file and console handlers.
+
+    The handlers run on a QueueListener thread, so logging calls from crawl
+    threads only enqueue the record instead of waiting on file/console I/O.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
@@ -17,13 +24,18 @@ def setup_logger(name='scraper', log_file='scraper.log', level=logging.INFO):
         fh.setLevel(level)
         fh_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         fh.setFormatter(fh_formatter)
-        logger.addHandler(fh)
 
         # Console handler
         ch = logging.StreamHandler()
         ch.setLevel(level)
         ch_formatter = logging.Formatter('%(levelname)s - %(message)s')
         ch.setFormatter(ch_formatter)
-        logger.addHandler(ch)
+
+        # Hand records to a background thread that owns both handlers
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, fh, ch, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(QueueHandler(log_queue))
 
     return logger
@@ -0,0 +1,28 @@
+import hashlib
+
+import numpy as np
+
+# 128-bit digests: plenty to tell page bodies apart, half the hex of sha256
+CONTENT_HASH_SIZE = 16
+
+def fast_content_hash(text: str) -> str:
+    """Hex digest identifying a page's text content
+
+    BLAKE2b is in hashlib on every Python build and is faster than SHA-256 in
+    software; the text is encoded to UTF-8 once and hashed in a single call.
+    """
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=CONTENT_HASH_SIZE).hexdigest()
+
+def fast_word_count(text: str) -> int:
+    """Number of whitespace-separated words in ``text``
+
+    Counts the starts of non-whitespace runs over the UTF-8 bytes in numpy
+    instead of building the list that ``len(text.split())`` would. Bytes up to
+    0x20 count as whitespace, so non-ASCII spaces such as U+00A0 do not split
+    words.
+    """
+    if not text:
+        return 0
+    data = np.frombuffer(text.encode('utf-8', 'ignore'), dtype=np.uint8)
+    ws = data <= 32
+    return int(np.count_nonzero(ws[:-1] & ~ws[1:])) + int(not ws[0])
@@ -1,18 +1,79 @@
 import asyncio
+import collections
+import contextlib
 import logging
+import os
 import time
-import threading
-from typing import List, Dict, Any, Optional, Set
-from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import json
+from typing import List, Dict, Any, Optional
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
 
 from .driver_pool import WebDriverPool
 from .threading_manager import ThreadingManager
-from .async_requests import AsyncHTTPClient, URLValidator
+from .async_requests import AsyncHTTPClient, URLValidator, NonTextContentError
+from .optimization import fast_content_hash, fast_word_count
+from .enhanced_crawler import (
+    parse_html, node_text, JS_APP_MARKERS_RE, META_DESCRIPTION_XPATH, HEADINGS_XPATH,
+    ANCHOR_HREFS_XPATH, BODY_TEXT_XPATH
+)
+
+# Statically fetched pages with less text than this and no links are re-rendered in a browser
+JS_MIN_WORDS = 20
+IMAGE_SRCS_XPATH = etree.XPath('//img/@src')
+
+# Everything _process_single_page needs from the DOM, gathered in one browser round trip
+PAGE_DATA_JS = """
+const meta = document.querySelector('meta[name="description"]');
+const headings = {};
+for (const h of document.querySelectorAll('h1, h2, h3, h4, h5, h6')) {
+    const tag = h.tagName.toLowerCase();
+    (headings[tag] = headings[tag] || []).push(h.textContent.trim());
+}
+return {
+    title: document.title || '',
+    meta: meta ? meta.content || '' : '',
+    headings: headings,
+    links: Array.from(document.querySelectorAll('a[href]'), a => a.href),
+    images: Array.from(document.querySelectorAll('img[src]'), img => img.src),
+    text: document.body ? document.body.innerText.trim() : ''
+};
+"""
+
+def safe_urljoin(base_url: str, ref: str) -> Optional[str]:
+    """urljoin that returns None for malformed references (e.g. "http://[::1") instead of raising"""
+    try:
+        return urljoin(base_url, ref.strip())
+    except ValueError:
+        return None
+
+class CrawlState:
+    """Bookkeeping for one crawl; stream_crawl starts every crawl with a fresh one
+    
+    Only touched from the event loop thread, so nothing here needs a lock.
+    """
+    
+    def __init__(self):
+        self.start_time = time.time()
+        # hash() of each queued URL: an 8-byte int per entry instead of the URL string
+        self.visited_hashes = set()
+        # content_hash -> first URL seen with that text, to skip pages that repeat it
+        self.content_owners = {}
+        self.urls_processed = 0
+        self.pages_scraped = 0
+        # Failure records, returned with the crawl data
+        self.errors = []
+        # {url, duplicate_of} for pages skipped as copies of an earlier page
+        self.duplicates = []
+        # {url, reason} for links to binary files (PDFs, images, ...)
+        self.skipped = []
 
 class OptimizedWebCrawler:
-    """High-performance web crawler with threading and Selenium optimization"""
+    """High-performance web crawler with threading and Selenium optimization
+    
+    Use ``async with OptimizedWebCrawler(...) as crawler:`` to run several crawls
+    over one HTTP connection pool; the synchronous crawl_site opens its own.
+    """
     
     def __init__(self, max_workers=10, max_drivers=5, headless=True):
         self.max_workers = max_workers
@@ -24,227 +85,361 @@ class OptimizedWebCrawler:
         self.threading_manager = ThreadingManager(max_workers=max_workers)
         self.url_validator = URLValidator()
         
-        # Thread-safe data structures
-        self._visited_urls = set()
-        self._lock = threading.Lock()
-        self._stats = {
-            'urls_processed': 0,
-            'pages_scraped': 0,
-            'errors': 0,
-            'start_time': time.time()
-        }
+        # State of the most recent crawl, reported by get_performance_stats
+        self._state = CrawlState()
+        # HTTP client shared by every crawl while the crawler is used as an async context manager
+        self._http = None
         
         self.logger = logging.getLogger(__name__)
         
-    def crawl_site(self, start_url: str, max_pages=100, max_depth=3) -> Dict[str, Any]:
+    async def __aenter__(self):
+        """Open one HTTP client (connection pool + DNS cache) for all crawls in the context"""
+        self._http = AsyncHTTPClient(max_connections=100, limit_per_host=10)
+        await self._http.__aenter__()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Close the shared HTTP client, then the browsers and worker threads"""
+        http, self._http = self._http, None
+        try:
+            await http.__aexit__(exc_type, exc_val, exc_tb)
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, self.close)
+    
+    def crawl_site(self, start_url: str, max_pages=100, max_depth=3, enable_javascript=False) -> Dict[str, Any]:
         """Main crawling function with performance optimizations"""
-        self.logger.info(f"Starting optimized crawl of {start_url}")
-        
-        # Validate and normalize start URL
-        if not self.url_validator.is_valid_url(start_url):
-            raise ValueError("Invalid start URL")
-        
-        start_url = self.url_validator.normalize_url(start_url)
-        domain = self.url_validator.extract_domain(start_url)
-        
+        return asyncio.run(self.crawl_site_async(start_url, max_pages, max_depth, enable_javascript))
+    
+    async def crawl_site_async(self, start_url: str, max_pages=100, max_depth=3,
+                               enable_javascript=False) -> Dict[str, Any]:
+        """Collect stream_crawl's records into a single crawl_data dict"""
         # Initialize crawl data
         crawl_data = {
             'site_map': {},
             'relationships': [],
             'metadata': {},
-            'errors': []
+            'errors': [],
+            'duplicates': [],
+            'skipped': []
         }
         
-        # Use threading manager for concurrent processing
-        with self.threading_manager as tm:
-            # Process URLs in batches
-            urls_to_process = [(start_url, 0)]  # (url, depth)
-            processed_urls = set()
+        state = CrawlState()
+        async for record in self.stream_crawl(start_url, max_pages, max_depth, enable_javascript, state):
+            url = record['url']
             
-            while urls_to_process and len(processed_urls) < max_pages:
-                batch = urls_to_process[:min(50, len(urls_to_process))]
-                urls_to_process = urls_to_process[len(batch):]
-                
-                # Process batch concurrently
-                batch_results = tm.process_urls_concurrent(
-                    [url for url, _ in batch],
-                    lambda url: self._process_single_page(url, domain, max_depth)
-                )
-                
-                # Process results and discover new URLs
-                for result in batch_results:
-                    if result and result['success']:
-                        url = result['url']
-                        processed_urls.add(url)
-                        
-                        # Add to site map
-                        crawl_data['site_map'][url] = result['data']
-                        
-                        # Add relationships
-                        for link in result['data'].get('links', []):
-                            crawl_data['relationships'].append({
-                                'from': url,
-                                'to': link,
-                                'type': 'link'
-                            })
-                        
-                        # Discover new URLs for next iteration
-                        new_urls = self._discover_new_urls(
-                            result['data'].get('links', []),
-                            domain,
-                            result['depth'] + 1,
-                            max_depth
-                        )
-                        
-                        for new_url in new_urls:
-                            if new_url not in processed_urls:
-                                urls_to_process.append((new_url, result['depth'] + 1))
-                
-                # Update stats
-                with self._lock:
-                    self._stats['urls_processed'] += len(batch)
+            # Add to site map
+            crawl_data['site_map'][url] = record['data']
+            
+            # Add relationships
+            for link in record['links']:
+                crawl_data['relationships'].append({
+                    'from': url,
+                    'to': link,
+                    'type': 'link'
+                })
+        
+        crawl_data['errors'] = list(state.errors)
+        crawl_data['duplicates'] = list(state.duplicates)
+        crawl_data['skipped'] = list(state.skipped)
         
         # Add metadata
         crawl_data['metadata'] = {
             'total_pages': len(crawl_data['site_map']),
             'total_links': len(crawl_data['relationships']),
-            'crawl_time': time.time() - self._stats['start_time'],
-            'errors': self._stats['errors']
+            'crawl_time': time.time() - state.start_time,
+            'errors': len(state.errors),
+            'duplicates': len(state.duplicates),
+            'skipped': len(state.skipped)
         }
         
         return crawl_data
     
-    def _process_single_page(self, url: str, domain: str, max_depth: int) -> Optional[Dict[str, Any]]:
-        """Process a single page with optimized settings"""
-        try:
-            # Get driver from pool
-            driver = self.driver_pool.get_driver()
-            if not driver:
-                return None
-            
+    async def stream_crawl(self, start_url: str, max_pages=100, max_depth=3, enable_javascript=False,
+                           state: Optional[CrawlState] = None):
+        """Crawl over plain HTTP, using the browser pool only for pages that need JavaScript
+        
+        Yields a {'url', 'data', 'links'} record per page as soon as it is crawled,
+        so callers that store pages as they go never hold the whole site in memory.
+        With enable_javascript=True every page is rendered in a browser. Pass a
+        CrawlState to read the crawl's errors and duplicates afterwards.
+        """
+        self.logger.info(f"Starting optimized crawl of {start_url}")
+        
+        # Validate and normalize start URL
+        if not self.url_validator.is_valid_url(start_url):
+            raise ValueError("Invalid start URL")
+        
+        start_url = self.url_validator.normalize_url(start_url)
+        domain = self.url_validator.extract_domain(start_url)
+        
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        queue.put_nowait((start_url, 0))  # (url, depth)
+        if state is None:
+            state = CrawlState()
+        self._state = state
+        state.visited_hashes.add(hash(start_url))
+        # Bounded, so consumers wait for the caller instead of piling up records
+        records = asyncio.Queue(maxsize=self.max_workers * 4)
+        pages_crawled = 0
+        in_flight = 0
+        # URLs that arrived while in-flight pages could still fill max_pages
+        deferred = collections.deque()
+        
+        async def fetch_page(client, url):
+            if not enable_javascript:
+                # HTTP errors, oversized bodies and timeouts raise and are recorded
+                # by the consumer; a browser would not do better with them
+                try:
+                    html = await client.fetch_text(url)
+                except NonTextContentError as exc:
+                    state.skipped.append({'url': url, 'reason': str(exc)})
+                    return None
+                # lxml releases the GIL while parsing, so other fetches keep going meanwhile
+                result = await loop.run_in_executor(
+                    parse_pool, self._process_static_page, url, html, domain
+                )
+                if result is not None:
+                    return result
+            # Selenium blocks, so JavaScript-rendered pages run on browser threads
+            return await loop.run_in_executor(
+                browser_pool, self._process_single_page, url, domain, max_depth
+            )
+        
+        async def consumer(client):
+            nonlocal pages_crawled, in_flight
+            while True:
+                url, depth = await queue.get()
+                try:
+                    if pages_crawled >= max_pages:
+                        continue
+                    # Pages still being fetched count towards the limit; hold this URL
+                    # back in case one of them fails or turns out to be a duplicate
+                    if pages_crawled + in_flight >= max_pages:
+                        deferred.append((url, depth))
+                        continue
+                    in_flight += 1
+                    accepted = False
+                    try:
+                        result = await fetch_page(client, url)
+                        state.urls_processed += 1
+                        if result and result['success']:
+                            state.pages_scraped += 1
+                            page_data = result['data']
+                            accepted = self._accept_page(state, url, page_data, depth)
+                    finally:
+                        in_flight -= 1
+                        # Queued before this item's task_done, so the crawl cannot end first
+                        if not accepted and deferred:
+                            queue.put_nowait(deferred.popleft())
+                    if not accepted:
+                        continue
+                    
+                    pages_crawled += 1
+                    # Discover new URLs; each one is queued at most once
+                    for new_url in self._discover_new_urls(
+                        state, page_data.get('links', []), domain, depth + 1, max_depth
+                    ):
+                        queue.put_nowait((new_url, depth + 1))
+                    await records.put({'url': url, 'data': page_data, 'links': page_data.get('links', [])})
+                except Exception as exc:
+                    # A bad page must not take the consumer down with it
+                    self._record_error(state, url, exc)
+                finally:
+                    queue.task_done()
+        
+        async def finish():
+            await queue.join()
+            await records.put(None)
+        
+        async with contextlib.AsyncExitStack() as stack:
+            # Reuse the crawler's client inside "async with", otherwise open one for this crawl
+            client = self._http or await stack.enter_async_context(
+                AsyncHTTPClient(max_connections=100, limit_per_host=10)
+            )
+            # One thread per browser, plus one per core for parsing static pages
+            browser_pool = stack.enter_context(ThreadPoolExecutor(max_workers=self.max_drivers))
+            parse_pool = stack.enter_context(ThreadPoolExecutor(max_workers=os.cpu_count() or 4))
+            if enable_javascript:
+                # Start the browsers in parallel up front instead of one per first
+                # request, on a browser thread so the event loop keeps running
+                await loop.run_in_executor(browser_pool, self.driver_pool.prewarm)
+            # Each consumer moves on as soon as its own page is done
+            tasks = [
+                asyncio.create_task(consumer(client))
+                for _ in range(self.max_workers * 4)
+            ]
+            tasks.append(asyncio.create_task(finish()))
             try:
-                # Navigate to page
-                driver.get(url)
-                
-                # Extract page data
-                page_data = {
-                    'url': url,
-                    'title': self._extract_title(driver),
-                    'meta_description': self._extract_meta_description(driver),
-                    'headings': self._extract_headings(driver),
-                    'links': self._extract_links(driver, domain),
-                    'images': self._extract_images(driver),
-                    'text_content': self._extract_text_content(driver),
-                    'load_time': time.time(),
-                    'depth': 0  # Will be set by caller
-                }
-                
-                # Return driver to pool
-                self.driver_pool.return_driver(driver)
-                
-                return {
-                    'success': True,
-                    'url': url,
-                    'data': page_data,
-                    'depth': 0
-                }
-                
-            except Exception as e:
-                self.driver_pool.return_driver(driver)
-                raise e
-                
-        except Exception as e:
-            self.logger.error(f"Error processing {url}: {e}")
-            with self._lock:
-                self._stats['errors'] += 1
+                while True:
+                    record = await records.get()
+                    if record is None:
+                        break
+                    yield record
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _accept_page(self, state: CrawlState, url: str, page_data: Dict[str, Any], depth: int) -> bool:
+        """Annotate a crawled page; returns False if its text duplicates an earlier page"""
+        text = page_data.get('text_content') or ""
+        content_hash = fast_content_hash(text)
+        
+        # Same text as an earlier page (mirrors, print views, ...): note it and move on
+        original = state.content_owners.setdefault(content_hash, url) if text else url
+        if original != url:
+            self.logger.debug(f"{url} duplicates {original}")
+            state.duplicates.append({'url': url, 'duplicate_of': original})
+            return False
+        
+        page_data['depth'] = depth
+        page_data['content_hash'] = content_hash
+        page_data['word_count'] = fast_word_count(text)
+        return True
+    
+    def _process_static_page(self, url: str, html: str, domain: str) -> Optional[Dict[str, Any]]:
+        """Extract page data from fetched HTML; returns None when the page needs a browser"""
+        if JS_APP_MARKERS_RE.search(html):
             return None
+        try:
+            tree = parse_html(html)
+        except Exception:
+            return None
+        
+        page_data = self._extract_static_page_data(tree, url, domain)
+        if not page_data['links'] and fast_word_count(page_data['text_content']) < JS_MIN_WORDS:
+            return None
+        
+        return {
+            'success': True,
+            'url': url,
+            'data': {'url': url, **page_data, 'load_time': time.time(), 'depth': 0},
+            'depth': 0
+        }
+    
+    def _process_single_page(self, url: str, domain: str, max_depth: int) -> Dict[str, Any]:
+        """Process a single page with optimized settings
+        
+        Runs on a browser thread; failures are raised to the calling consumer,
+        which records them in the crawl's state.
+        """
+        # Get driver from pool
+        driver = self.driver_pool.get_driver()
+        if not driver:
+            raise RuntimeError("No WebDriver available")
+        
+        try:
+            # Navigate to page
+            driver.get(url)
+            
+            # Extract page data
+            page_data = {
+                'url': url,
+                **self._extract_all_page_data(driver, domain),
+                'load_time': time.time(),
+                'depth': 0  # Will be set by caller
+            }
+        finally:
+            # Return driver to pool
+            self.driver_pool.return_driver(driver)
+        
+        return {
+            'success': True,
+            'url': url,
+            'data': page_data,
+            'depth': 0
+        }
     
-    def _discover_new_urls(self, links: List[str], domain: str, current_depth: int, max_depth: int) -> List[str]:
+    def _record_error(self, state: CrawlState, url: str, error: Exception):
+        """Log a failed page and keep a record of it for crawl_data['errors']"""
+        self.logger.error(f"Error processing {url}: {error}")
+        state.errors.append({
+            'url': url,
+            'error_type': type(error).__name__,
+            'error_message': str(error)[:2000]
+        })
+    
+    def _discover_new_urls(self, state: CrawlState, links: List[str], domain: str, current_depth: int,
+                           max_depth: int) -> List[str]:
         """Discover new URLs for crawling with deduplication"""
         if current_depth >= max_depth:
             return []
         
+        # Only called from the event loop thread, so the visited set needs no lock
+        visited = state.visited_hashes
         new_urls = []
         for link in links:
             normalized = self.url_validator.normalize_url(link)
-            if self.url_validator.extract_domain(normalized) == domain:
-                with self._lock:
-                    if normalized not in self._visited_urls:
-                        self._visited_urls.add(normalized)
-                        new_urls.append(normalized)
+            h = hash(normalized)
+            if h not in visited and self.url_validator.extract_domain(normalized) == domain:
+                visited.add(h)
+                new_urls.append(normalized)
         
         return new_urls
     
-    def _extract_title(self, driver) -> str:
-        """Extract page title"""
-        try:
-            return driver.execute_script("return document.title") or ""
-        except:
-            return ""
-    
-    def _extract_meta_description(self, driver) -> str:
-        """Extract meta description"""
+    def _extract_all_page_data(self, driver, domain: str) -> Dict[str, Any]:
+        """Extract title, meta description, headings, links, images and text in one script call"""
         try:
-            meta = driver.execute_script(
-                "return document.querySelector('meta[name=\"description\"]')?.content || ''"
-            )
-            return meta
-        except:
-            return ""
+            data = driver.execute_script(PAGE_DATA_JS) or {}
+        except Exception as e:
+            self.logger.warning(f"Page data extraction failed: {e}")
+            data = {}
+        
+        links = [href for href in data.get('links', [])
+                 if self.url_validator.extract_domain(href) == domain]
+        return {
+            'title': data.get('title') or "",
+            'meta_description': data.get('meta') or "",
+            'headings': data.get('headings') or {},
+            'links': links,
+            'images': data.get('images') or [],
+            'text_content': data.get('text') or ""
+        }
     
-    def _extract_headings(self, driver) -> Dict[str, List[str]]:
-        """Extract headings (h1-h6)"""
+    def _extract_static_page_data(self, tree, url: str, domain: str) -> Dict[str, Any]:
+        """Same fields as _extract_all_page_data, read from an lxml tree"""
+        title = tree.findtext('.//title') or ""
+        meta = META_DESCRIPTION_XPATH(tree)
+        
         headings = {}
-        try:
-            for level in range(1, 7):
-                h_tags = driver.execute_script(
-                    f"return Array.from(document.querySelectorAll('h{level}')).map(h => h.textContent.trim())"
-                )
-                if h_tags:
-                    headings[f'h{level}'] = h_tags
-        except:
-            pass
-        return headings
-    
-    def _extract_links(self, driver, domain: str) -> List[str]:
-        """Extract internal links"""
+        for h in HEADINGS_XPATH(tree):
+            headings.setdefault(h.tag, []).append(node_text(h))
+        
         links = []
-        try:
-            hrefs = driver.execute_script(
-                "return Array.from(document.querySelectorAll('a[href]')).map(a => a.href)"
-            )
-            for href in hrefs:
-                if self.url_validator.extract_domain(href) == domain:
-                    links.append(href)
-        except:
-            pass
-        return links
-    
-    def _extract_images(self, driver) -> List[str]:
-        """Extract image URLs"""
-        try:
-            return driver.execute_script(
-                "return Array.from(document.querySelectorAll('img[src]')).map(img => img.src)"
-            )
-        except:
-            return []
-    
-    def _extract_text_content(self, driver) -> str:
-        """Extract main text content"""
-        try:
-            return driver.execute_script(
-                "return document.body ? document.body.innerText.trim() : ''"
-            )
-        except:
-            return ""
+        for href in ANCHOR_HREFS_XPATH(tree):
+            href = safe_urljoin(url, href)
+            if href and self.url_validator.extract_domain(href) == domain:
+                links.append(href)
+        
+        images = []
+        for src in IMAGE_SRCS_XPATH(tree):
+            src = safe_urljoin(url, src)
+            if src:
+                images.append(src)
+        
+        return {
+            'title': title.strip(),
+            'meta_description': meta[0] if meta else "",
+            'headings': headings,
+            'links': links,
+            'images': images,
+            'text_content': ' '.join(' '.join(BODY_TEXT_XPATH(tree)).split())
+        }
     
     def get_performance_stats(self) -> Dict[str, Any]:
         """Get performance statistics"""
-        with self._lock:
-            stats = self._stats.copy()
-            stats['elapsed_time'] = time.time() - stats['start_time']
-            stats['pages_per_second'] = stats['urls_processed'] / max(stats['elapsed_time'], 1)
-            return stats
+        state = self._state
+        urls_processed = state.urls_processed
+        elapsed_time = time.time() - state.start_time
+        return {
+            'urls_processed': urls_processed,
+            'pages_scraped': state.pages_scraped,
+            'errors': len(state.errors),
+            'start_time': state.start_time,
+            'elapsed_time': elapsed_time,
+            'pages_per_second': urls_processed / max(elapsed_time, 1)
+        }
     
     def close(self):
         """Clean up resources"""
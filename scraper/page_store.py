@@ -0,0 +1,64 @@
+import sqlite3
+import logging
+
+import orjson
+
+class PageStore:
+    """On-disk store for per-page crawl analysis (url -> page_data)
+
+    Pages are written as orjson blobs into a WAL-mode SQLite file and committed
+    in batches, so a crawl's memory use does not grow with the number of pages
+    and finished pages survive a crash.
+    """
+
+    def __init__(self, path, batch_size=200):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = 0
+        self.logger = logging.getLogger(__name__)
+
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, data BLOB NOT NULL)')
+        self._conn.commit()
+
+    def put(self, url, page_data):
+        """Store (or replace) a page's analysis
+
+        An upsert rather than INSERT OR REPLACE, which would delete the row and
+        move a re-crawled page to the end of items().
+        """
+        self._conn.execute(
+            'INSERT INTO pages (url, data) VALUES (?, ?) '
+            'ON CONFLICT(url) DO UPDATE SET data = excluded.data',
+            (url, orjson.dumps(page_data))
+        )
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def get(self, url):
+        row = self._conn.execute('SELECT data FROM pages WHERE url = ?', (url,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def items(self):
+        """Yield (url, page_data) pairs one row at a time, in the order pages were first stored"""
+        self.flush()
+        for url, data in self._conn.execute('SELECT url, data FROM pages ORDER BY rowid'):
+            yield url, orjson.loads(data)
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def flush(self):
+        if self._pending:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        try:
+            self.flush()
+            self._conn.close()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error closing page store {self.path}: {e}")
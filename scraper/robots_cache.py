@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+class RobotsCache:
+    """Per-host robots.txt cache for asyncio crawlers
+
+    Each host's robots.txt is fetched at most once per ``ttl`` seconds; concurrent
+    callers for the same host wait on a per-host lock instead of refetching.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._cache = {}  # origin -> (fetched_at, RobotFileParser)
+        self._locks = defaultdict(asyncio.Lock)
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _origin(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme or 'https'}://{parsed.netloc or parsed.path}"
+
+    def _fresh(self, origin):
+        entry = self._cache.get(origin)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    async def get(self, session, url):
+        """Return the parsed robots.txt for the host of ``url``"""
+        origin = self._origin(url)
+        parser = self._fresh(origin)
+        if parser is not None:
+            return parser
+
+        async with self._locks[origin]:
+            # Another task may have filled the entry while we waited
+            parser = self._fresh(origin)
+            if parser is None:
+                parser = await self._fetch(session, origin)
+                self._cache[origin] = (time.monotonic(), parser)
+            return parser
+
+    async def _fetch(self, session, origin):
+        robots_url = f"{origin}/robots.txt"
+        parser = RobotFileParser(robots_url)
+        try:
+            async with session.get(robots_url) as response:
+                # Same status handling as RobotFileParser.read()
+                if response.status in (401, 403):
+                    parser.disallow_all = True
+                elif 400 <= response.status < 500:
+                    parser.allow_all = True
+                elif response.status == 200:
+                    parser.parse((await response.text(errors='replace')).splitlines())
+                else:
+                    parser.allow_all = True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Could not fetch {robots_url}: {e}")
+            parser.allow_all = True
+        parser.modified()
+        return parser
+
+    async def can_fetch(self, session, url, user_agent='*'):
+        """Check ``url`` against its host's cached robots.txt"""
+        parser = await self.get(session, url)
+        return parser.can_fetch(user_agent, url)
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,29 @@
+from lxml import etree
+
+# <loc> appears in both <urlset> and <sitemapindex>; some sitemaps omit the namespace
+SITEMAP_LOC_TAGS = ('{http://www.sitemaps.org/schemas/sitemap/0.9}loc', 'loc')
+
+def release_element(elem):
+    """Free an element handled by iterparse together with the siblings already processed"""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is None:
+        return
+    while elem.getprevious() is not None:
+        del parent[0]
+    # <loc> lives inside <url>/<sitemap>; drop the finished entries as well
+    grandparent = parent.getparent()
+    if grandparent is not None:
+        while parent.getprevious() is not None:
+            del grandparent[0]
+
+def iter_sitemap_locs(sitemap_stream):
+    """Yield the <loc> texts of a sitemap file object, freeing each entry once read
+
+    Memory stays flat however large the sitemap is.
+    """
+    for _, loc in etree.iterparse(sitemap_stream, events=('end',), tag=SITEMAP_LOC_TAGS,
+                                  huge_tree=True, recover=True):
+        url = (loc.text or '').strip()
+        release_element(loc)
+        yield url
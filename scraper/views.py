@@ -1,4 +1,6 @@
 import os
+import codecs
+import itertools
 import threading
 import time
 import logging
@@ -20,9 +22,14 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 import pandas as pd
+import xlsxwriter
 import re
 
+from .driver_pool import WebDriverPool, watch_dom_mutations, wait_for_dom_settle
+from .enhanced_crawler import parse_html, CHARSET_RE, META_DESCRIPTION_XPATH
+
 # Setup logger
 logger = logging.getLogger('scraper')
 log_records = []
@@ -57,6 +64,36 @@ MAX_CRAWL_DEPTH = 10
 REQUEST_DELAY = 0.25  # seconds
 PAGE_LOAD_TIMEOUT = 30  # seconds
 MAX_PAGE_SIZE = 10 * 1024 * 1024 # 10 MB
+SITEMAP_RE = re.compile(r'(?im)^\s*Sitemap:\s*(\S+)')
+# lxml's C parser is several times faster than html.parser; fall back if it is missing
+# Link targets in document order: every a[href] (navigation menus and pagination
+# links included) and form actions
+LINK_TARGETS_XPATH = etree.XPath('//a/@href | //form/@action')
+ONCLICK_XPATH = etree.XPath('//*[self::button or self::div or self::span or self::a]/@onclick')
+DATA_LINK_XPATH = etree.XPath(
+    '//*[self::button or self::div or self::span or self::a]'
+    '/@*[name()="data-href" or name()="data-url" or name()="data-link"]'
+)
+ONCLICK_URL_RE = re.compile(r'["\']([^"\']+)["\']')
+# Subtrees dropped before extracting page content
+NON_CONTENT_XPATH = etree.XPath('//script | //style | //nav | //header | //footer | //aside')
+# Every element the content extractor reads, matched in one pass over the tree
+CONTENT_ELEMENTS_XPATH = etree.XPath(
+    '//*[self::h1 or self::h2 or self::h3 or self::h4 or self::h5 or self::h6 or self::p'
+    ' or self::td or self::th'
+    ' or ((self::div or self::span) and (contains(@class, "content") or contains(@class, "description")'
+    ' or contains(@class, "text")))'
+    ' or contains(@class, "spec") or contains(@class, "feature") or contains(@class, "detail")'
+    ' or contains(@id, "content") or contains(@id, "description") or contains(@id, "text")]'
+)
+# When a container and an element inside it have the same text, the row keeps the element's tag
+SPECIFIC_CONTENT_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'td', 'th'])
+IMAGE_ALTS_XPATH = etree.XPath('//img/@alt')
+# Title lookups read this much of a page at a time and stop once </title> is parsed
+TITLE_CHUNK_SIZE = 32 * 1024
+# After the title, bodies with at most this much left are read to the end so the
+# keep-alive connection goes back to the session's pool; longer ones are closed
+TITLE_DRAIN_LIMIT = 256 * 1024
 
 def create_driver():    
     options = Options()
@@ -67,6 +104,16 @@ def create_driver():
     driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
     return driver
 
+def release_driver(driver_pool, driver):
+    """Clear a driver's cookies and page, then hand it back to the pool"""
+    try:
+        driver.delete_all_cookies()
+        driver.get('about:blank')
+    except Exception:
+        driver_pool.discard_driver(driver)
+    else:
+        driver_pool.return_driver(driver)
+
 def is_valid_url(url, base_netloc):
     try:
         parsed = urlparse(url)
@@ -86,66 +133,107 @@ def get_robot_parser(base_url):
         logger.warning(f"Error fetching/parsing robots.txt for {base_url}: {e}")
         return None
 
-def get_page_name(soup):
-    if soup.title:
-        return soup.title.string.strip()
+def get_page_name(tree):
+    title = tree.findtext('.//title')
+    if title is not None:
+        return title.strip()
     return "No Title"
 
-def extract_content(soup, url):
+def fetch_page_name(session, url, timeout=15):
+    """Read a page's <title> as the HTML streams in, without downloading all of a large page
+
+    Returns None if the page is not a 200 or its static HTML has no title, or
+    an empty one.
+    """
+    with session.get(url, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            return None
+        chunks = response.iter_content(TITLE_CHUNK_SIZE)
+        try:
+            return _read_title(response, chunks)
+        finally:
+            release_response(response, chunks)
+
+def release_response(response, chunks):
+    """Finish with a streamed response, keeping its connection when that is cheap
+
+    Reads what is left of the body if it is under TITLE_DRAIN_LIMIT, so the
+    connection can be reused, then closes the response.
+    """
+    drained = 0
+    for chunk in chunks:
+        drained += len(chunk)
+        if drained > TITLE_DRAIN_LIMIT:
+            break
+    response.close()
+
+def _read_title(response, chunks):
+    """Parse chunks until </title>; None if the HTML has no title or an empty one"""
+    first = next(chunks, b'')
+    # Fed bytes, libxml2 assumes Latin-1 unless it is told otherwise
+    match = (CHARSET_RE.search(response.headers.get('content-type', '').encode('latin-1'))
+             or CHARSET_RE.search(first[:2048]))
+    encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = 'utf-8'
+    parser = etree.HTMLPullParser(events=('end',), tag='title', encoding=encoding)
+    for chunk in itertools.chain((first,), chunks):
+        parser.feed(chunk)
+        for _, title in parser.read_events():
+            return (title.text or '').strip() or None
+    return None
+
+def extract_content(tree, url):
     content = []
     try:
         # Remove script and style tags
-        for script_or_style in soup(['script', 'style', 'nav', 'header', 'footer', 'aside']):
-            script_or_style.extract()
-
-        # Enhanced: Extract from more content types
-        content_selectors = [
-            'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-            'p', 
-            'div[class*="content"]', 'div[class*="description"]', 'div[class*="text"]',
-            'span[class*="content"]', 'span[class*="description"]', 'span[class*="text"]',
-            'li[class*="feature"]', 'li[class*="spec"]', 'li[class*="detail"]',
-            'td', 'th',
-            '[class*="spec"]', '[class*="feature"]', '[class*="detail"]',
-            '[id*="content"]', '[id*="description"]', '[id*="text"]'
-        ]
-        
-        # Extract from specific selectors
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                text = element.get_text(strip=True)
-                if text and len(text) > 10:  # Filter out very short text
-                    # Determine appropriate tag name
-                    tag_name = element.name or 'content'
-                    if element.get('class'):
-                        tag_name = f"{tag_name}_{'_'.join(element.get('class', []))}"
-                    content.append((tag_name, text))
+        for element in NON_CONTENT_XPATH(tree):
+            element.drop_tree()
+
+        # Enhanced: Extract from more content types, in document order
+        for element in CONTENT_ELEMENTS_XPATH(tree):
+            # Same text as BeautifulSoup's get_text(strip=True)
+            text = ''.join(part.strip() for part in element.itertext())
+            if text and len(text) > 10:  # Filter out very short text
+                # Determine appropriate tag name
+                tag_name = element.tag
+                classes = element.get('class', '').split()
+                if classes:
+                    tag_name = f"{tag_name}_{'_'.join(classes)}"
+                content.append((tag_name, text, element.tag in SPECIFIC_CONTENT_TAGS))
 
         # Also extract from meta descriptions
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            content.append(('meta_description', meta_desc['content']))
+        meta_desc = META_DESCRIPTION_XPATH(tree)
+        if meta_desc and meta_desc[0]:
+            content.append(('meta_description', meta_desc[0], False))
         
         # Extract from title
-        if soup.title and soup.title.string:
-            content.append(('title', soup.title.string.strip()))
+        title = tree.findtext('.//title')
+        if title:
+            content.append(('title', title.strip(), False))
 
         # Extract from alt text of images
-        for img in soup.find_all('img', alt=True):
-            if img.get('alt') and len(img['alt']) > 10:
-                content.append(('image_alt', img['alt']))
+        for alt in IMAGE_ALTS_XPATH(tree):
+            if len(alt) > 10:
+                content.append(('image_alt', alt, False))
 
-        # Remove duplicates while preserving order
-        seen = set()
+        # Remove duplicates while preserving order; a heading, paragraph or cell
+        # keeps its own tag even when a matching container came first
+        first_seen = {}
         unique_content = []
-        for tag, text in content:
-            if text not in seen:
-                seen.add(text)
-                unique_content.append((tag, text))
+        for tag, text, specific in content:
+            index = first_seen.get(text)
+            if index is None:
+                first_seen[text] = len(unique_content)
+                unique_content.append((tag, text, specific))
+            elif specific and not unique_content[index][2]:
+                unique_content[index] = (tag, text, True)
+        unique_content = [(tag, text) for tag, text, _ in unique_content]
 
         full_text = "\n".join([text for _, text in unique_content])
-        if not full_text.strip() and len(str(soup)) > 500:
+        if not full_text.strip() and len(lxml_html.tostring(tree)) > 500:
             logger.warning(f"Low text content extracted from {url} (possibly JS-heavy)")
             
         return unique_content
@@ -182,95 +270,58 @@ def filter_data_exclude_common(data, common_data):
     filtered = [entry for entry in data if entry['Content'] not in common_contents]
     return filtered
 
+def write_sheet(workbook, sheet_name, columns, rows):
+    """Write a header and rows strictly in row order, as constant_memory mode requires"""
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, columns)
+    row_num = 0
+    for row_num, row in enumerate(rows, start=1):
+        worksheet.write_row(row_num, 0, row)
+    return worksheet, row_num
+
 def save_to_excel(filename='scraped_data.xlsx'):
     global scraped_data, show_common_data
     filepath = os.path.join(settings.BASE_DIR, filename)
+    common_data = None
+    rows = scraped_data
     if show_common_data:
         common_data = find_common_data(scraped_data)
-        filtered_data = filter_data_exclude_common(scraped_data, common_data)
+        rows = filter_data_exclude_common(scraped_data, common_data)
 
-        # Group filtered_data by URL
-        grouped = {}
-        for entry in filtered_data:
-            url = entry['URL']
-            if url not in grouped:
-                grouped[url] = []
-            grouped[url].append(entry)
-
-        # Group filtered_data by URL
-        grouped = {}
-        for entry in filtered_data:
-            url = entry['URL']
-            if url not in grouped:
-                grouped[url] = []
-            grouped[url].append(entry)
-
-        summary = [] # Moved initialization outside writer block
-        for url, entries in grouped.items():
-            df = pd.DataFrame(entries)
-            total_words = df['Word Count'].sum()
-            summary.append({'URL': url, 'Total Words': total_words})
-
-        with pd.ExcelWriter(filepath) as writer:
-            # Write summary sheet first
-            df_summary = pd.DataFrame(summary)
-            df_summary.to_excel(writer, sheet_name='Summary', index=False)
-
-            for url, entries in grouped.items():
-                df = pd.DataFrame(entries)
-                sheet_name = slugify(url)[:31]
-                # Ensure uniqueness if slugify produces duplicates for different URLs
-                original_sheet_name = sheet_name
-                counter = 1
-                while sheet_name in writer.sheets: # Check if sheet name already exists
-                    sheet_name = f"{original_sheet_name[:28]}_{counter}" # Truncate to make space for counter
-                    counter += 1
-
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                worksheet = writer.sheets[sheet_name]
-                worksheet.cell(row=len(df) + 1, column=1, value='Total Words')
-                worksheet.cell(row=len(df) + 1, column=5, value=total_words)
+    # Build one DataFrame and let pandas group it, instead of a DataFrame per URL
+    df_all = pd.DataFrame(rows, columns=['URL', 'Page Name', 'Heading/Tag', 'Content', 'Word Count'])
+    grouped = df_all.groupby('URL', sort=False)
+    total_words = grouped['Word Count'].sum()
 
+    # constant_memory flushes every row to disk once the next one starts, so the
+    # workbook never holds more than one row per sheet in memory
+    workbook = xlsxwriter.Workbook(filepath, {'constant_memory': True})
+    try:
+        # Write summary sheet first
+        write_sheet(workbook, 'Summary', ['URL', 'Total Words'], total_words.items())
+
+        sheet_names = set()
+        for url, df in grouped:
+            # Write data to sheet named by URL (sanitized)
+            sheet_name = slugify(url)[:31]
+            # Ensure uniqueness if slugify produces duplicates for different URLs
+            original_sheet_name = sheet_name
+            counter = 1
+            while sheet_name in sheet_names: # Check if sheet name already exists
+                sheet_name = f"{original_sheet_name[:28]}_{counter}" # Truncate to make space for counter
+                counter += 1
+            sheet_names.add(sheet_name)
+            worksheet, last_row = write_sheet(workbook, sheet_name, list(df.columns), df.itertuples(index=False))
+            # Write total words at bottom of sheet
+            worksheet.write(last_row + 1, 0, 'Total Words')
+            worksheet.write(last_row + 1, 4, total_words[url])
+
+        if common_data is not None:
             # Write common data sheet
-            df_common = pd.DataFrame(common_data)
-            df_common.to_excel(writer, sheet_name='Common Data', index=False)
-    else:
-        # Group data by URL
-        grouped = {}
-        for entry in scraped_data:
-            url = entry['URL']
-            if url not in grouped:
-                grouped[url] = []
-            grouped[url].append(entry)
-
-        summary = [] # Moved initialization outside writer block
-        for url, entries in grouped.items():
-            df = pd.DataFrame(entries)
-            # Calculate total words for this URL
-            total_words = df['Word Count'].sum()
-            # Add to summary
-            summary.append({'URL': url, 'Total Words': total_words})
-
-        with pd.ExcelWriter(filepath) as writer:
-            # Write summary sheet first
-            df_summary = pd.DataFrame(summary)
-            df_summary.to_excel(writer, sheet_name='Summary', index=False)
-
-            for url, entries in grouped.items():
-                df = pd.DataFrame(entries)
-                # Write data to sheet named by URL (sanitized)
-                sheet_name = slugify(url)[:31]
-                # Ensure uniqueness if slugify produces duplicates for different URLs
-                original_sheet_name = sheet_name
-                counter = 1
-                while sheet_name in writer.sheets: # Check if sheet name already exists
-                    sheet_name = f"{original_sheet_name[:28]}_{counter}" # Truncate to make space for counter
-                    counter += 1
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                # Write total words at bottom of sheet
-                worksheet = writer.sheets[sheet_name]
-                worksheet.cell(row=len(df) + 1, column=1, value='Total Words')
-                worksheet.cell(row=len(df) + 1, column=5, value=total_words)
+            write_sheet(workbook, 'Common Data', ['Content', 'URLs', 'Word Count'],
+                        ((item['Content'], str(item['URLs']), item['Word Count']) for item in common_data))
+    finally:
+        workbook.close()
 
 from django.shortcuts import redirect
 
@@ -292,7 +343,8 @@ def simple_site_mapping(start_url):
     """Simple site mapping function that discovers URLs through sitemaps and robots.txt."""
     logger.info(f"Starting simple site mapping for {start_url}")
 
-    driver = create_driver()
+    # Only started if a page's title can't be read from its static HTML
+    driver = None
     base_netloc = urlparse(start_url).netloc
     discovered_urls = set()
     site_map_data = []
@@ -317,7 +369,7 @@ def simple_site_mapping(start_url):
             urls_found_in_sitemap = set()
             try:
                 # Try parsing as XML
-                soup = BeautifulSoup(content, 'xml')
+                soup = BeautifulSoup(content, 'lxml-xml')
                 loc_elements = soup.find_all('loc')
                 if loc_elements:
                     logger.info(f"Successfully parsed {sitemap_url_source} as XML. Found {len(loc_elements)} <loc> elements.")
@@ -358,11 +410,10 @@ def simple_site_mapping(start_url):
             logger.info(f"robots.txt response status: {response.status_code}, content-type: {response.headers.get('content-type', '')}")
             if response.status_code == 200:
                 robots_content = response.text
-                sitemap_matches = re.findall(r'Sitemap:\s*(.+)', robots_content, re.IGNORECASE)
+                sitemap_matches = SITEMAP_RE.findall(robots_content)
                 if sitemap_matches:
                     logger.info(f"Found {len(sitemap_matches)} sitemap references in robots.txt")
                     for sitemap_url_from_robots in sitemap_matches:
-                        sitemap_url_from_robots = sitemap_url_from_robots.strip()
                         try:
                             logger.info(f"Fetching sitemap from robots.txt: {sitemap_url_from_robots}")
                             sitemap_response = session.get(sitemap_url_from_robots, timeout=10)
@@ -415,9 +466,17 @@ def simple_site_mapping(start_url):
         for i, url in enumerate(discovered_urls):
             try:
                 logger.info(f"Processing URL {i+1}/{len(discovered_urls)}: {url}")
-                driver.get(url)
-                soup = BeautifulSoup(driver.page_source, 'html.parser')
-                page_name = get_page_name(soup)
+                page_name = None
+                try:
+                    page_name = fetch_page_name(session, url)
+                except requests.RequestException as e:
+                    logger.debug(f"Static fetch failed for {url}: {e}")
+                if page_name is None:
+                    # Title is missing from the static HTML; let the browser render it
+                    if driver is None:
+                        driver = create_driver()
+                    driver.get(url)
+                    page_name = get_page_name(parse_html(driver.page_source))
 
                 site_map_data.append({
                     'URL': url,
@@ -465,8 +524,12 @@ def site_mapping(request):
                     if site_map_data:
                         # Save site map data to Excel file
                         filepath = os.path.join(settings.BASE_DIR, 'sitemap_results.xlsx')
-                        df = pd.DataFrame(site_map_data)
-                        df.to_excel(filepath, index=False)
+                        workbook = xlsxwriter.Workbook(filepath, {'constant_memory': True})
+                        try:
+                            write_sheet(workbook, 'Sheet1', ['URL', 'PageName'],
+                                        ((entry['URL'], entry['PageName']) for entry in site_map_data))
+                        finally:
+                            workbook.close()
                         logger.info(f"Site map data saved to {filepath}")
                     scrape_progress['status'] = 'completed' if site_map_data else 'failed'
                 
@@ -505,9 +568,15 @@ def web_crawling(request):
             
             # Start scraping in background thread
             def scrape_and_save():
-                crawl_site(url)
-                save_to_excel('crawling_results.xlsx')
-                scrape_progress['status'] = 'completed'
+                try:
+                    crawl_site(url)
+                    save_to_excel('crawling_results.xlsx')
+                except Exception as e:
+                    logger.exception(f"Crawl of {url} failed: {e}")
+                    scrape_progress['status'] = 'failed'
+                    return
+                if scrape_progress['status'] != 'failed':
+                    scrape_progress['status'] = 'completed'
             
             thread = threading.Thread(target=scrape_and_save)
             thread.start()
@@ -544,7 +613,7 @@ def discover_all_urls(start_url, driver):
             try:
                 driver.get(sitemap_url)
                 if "404" not in driver.title and "not found" not in driver.title.lower():
-                    soup = BeautifulSoup(driver.page_source, 'xml')
+                    soup = BeautifulSoup(driver.page_source, 'lxml-xml')
                     # Extract URLs from sitemap
                     for loc in soup.find_all('loc'):
                         url = loc.text.strip()
@@ -570,7 +639,7 @@ def discover_all_urls(start_url, driver):
                 sitemap_url = sitemap_url.strip()
                 try:
                     driver.get(sitemap_url)
-                    soup = BeautifulSoup(driver.page_source, 'xml')
+                    soup = BeautifulSoup(driver.page_source, 'lxml-xml')
                     for loc in soup.find_all('loc'):
                         url = loc.text.strip()
                         if is_valid_url(url, base_netloc):
@@ -586,6 +655,15 @@ def discover_all_urls(start_url, driver):
 
 def comprehensive_crawl_site(start_url):
     """Comprehensive crawling system that finds and reads ALL pages"""
+    max_workers = min(24, multiprocessing.cpu_count() * 4)  # Slightly reduced for stability
+    # One browser per worker, reused across URLs instead of launched and quit per page
+    driver_pool = WebDriverPool(max_drivers=max_workers, driver_factory=create_driver)
+    try:
+        _comprehensive_crawl(start_url, driver_pool, max_workers)
+    finally:
+        driver_pool.close_all()
+
+def _comprehensive_crawl(start_url, driver_pool, max_workers):
     global scraped_data, scrape_progress, processed_urls_status
     scraped_data = []
     processed_urls_status = []
@@ -595,7 +673,6 @@ def comprehensive_crawl_site(start_url):
     progress_lock = threading.Lock()  # Add progress lock
     
     # Increase limits for comprehensive crawling
-    max_workers = min(24, multiprocessing.cpu_count() * 4)  # Slightly reduced for stability
     max_depth = 15   # Increased depth
     logger.info(f"Using {max_workers} threads for crawling")
     logger.info(f"Starting comprehensive crawling with {max_workers} threads, depth {max_depth}")
@@ -604,7 +681,16 @@ def comprehensive_crawl_site(start_url):
     url_queue = Queue()
     
     # Phase 1: Discover all URLs using sitemaps and systematic exploration
-    initial_driver = create_driver()
+    try:
+        initial_driver = driver_pool.get_driver()
+    except Exception as e:
+        # An empty pool starts Chrome here, and a failed start raises
+        logger.error(f"Could not start a WebDriver to crawl {start_url}: {e}")
+        initial_driver = None
+    if initial_driver is None:
+        logger.error(f"No WebDriver available to start crawling {start_url}")
+        scrape_progress['status'] = 'failed'
+        return
     try:
         discovered_urls = discover_all_urls(start_url, initial_driver)
         
@@ -618,7 +704,7 @@ def comprehensive_crawl_site(start_url):
         logger.info(f"Added {len(discovered_urls) + 1} URLs to initial queue")
         
     finally:
-        initial_driver.quit()
+        release_driver(driver_pool, initial_driver)
     
     # Initialize progress tracking
     with progress_lock:
@@ -648,7 +734,9 @@ def comprehensive_crawl_site(start_url):
         new_urls = []
         
         try:
-            driver = create_driver()
+            driver = driver_pool.get_driver()
+            if driver is None:
+                return []
             driver.implicitly_wait(8)  # Slightly increased for comprehensive crawling
             
             logger.info(f"Comprehensively processing URL: {url} (Depth: {depth})")
@@ -660,16 +748,21 @@ def comprehensive_crawl_site(start_url):
                     lambda d: d.execute_script("return document.readyState") == "complete"
                 )
                 
-                # Multiple scroll attempts to load all dynamic content
+                # Multiple scroll attempts to load all dynamic content; each step waits
+                # only until the DOM stops changing, at most as long as the old sleeps.
+                # The watch is restarted before every scroll so each wait starts fresh.
                 for i in range(3):
+                    watch_dom_mutations(driver)
                     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(2)
+                    wait_for_dom_settle(driver, timeout=2)
+                    watch_dom_mutations(driver)
                     driver.execute_script(f"window.scrollTo(0, {i * 500});")
-                    time.sleep(1)
+                    wait_for_dom_settle(driver, timeout=1)
                 
                 # Scroll back to top
+                watch_dom_mutations(driver)
                 driver.execute_script("window.scrollTo(0, 0);")
-                time.sleep(2)
+                wait_for_dom_settle(driver, timeout=2)
                 
             except Exception as e:
                 logger.warning(f"Page loading issues for {url}: {e}")
@@ -681,62 +774,48 @@ def comprehensive_crawl_site(start_url):
                     processed_urls_status.append({'URL': url, 'Status': 'page_too_large'})
                 return []
 
-            soup = BeautifulSoup(html, 'html.parser')
-            page_name = get_page_name(soup)
-            content = extract_content(soup, url)
+            tree = parse_html(html)
+            page_name = get_page_name(tree)
+            # Read link targets before extract_content drops nav/header/footer from the tree
+            link_refs = LINK_TARGETS_XPATH(tree)
+            for onclick in ONCLICK_XPATH(tree):
+                if 'location' in onclick:
+                    href_match = ONCLICK_URL_RE.search(onclick)
+                    if href_match:
+                        link_refs.append(href_match.group(1))
+            link_refs.extend(DATA_LINK_XPATH(tree))
+            content = extract_content(tree, url)
             
+            # Build the page's rows outside the lock, then add them in one batch
+            rows = [{
+                'URL': url,
+                'Page Name': page_name,
+                'Heading/Tag': tag_name,
+                'Content': text,
+                'Word Count': len(text.split())
+            } for tag_name, text in content]
+            # Only mark as completed if content was actually extracted
+            status = 'completed' if content else 'no_extractable_content'
+
             # Thread-safe data addition
             with data_lock:
-                for tag_name, text in content:
-                    scraped_data.append({
-                        'URL': url,
-                        'Page Name': page_name,
-                        'Heading/Tag': tag_name,
-                        'Content': text,
-                        'Word Count': len(text.split())
-                    })
-                if content: # Only mark as completed if content was actually extracted
-                    processed_urls_status.append({'URL': url, 'Status': 'completed'})
-                else: # If no content extracted, but no other error, mark as no_extractable_content
-                    processed_urls_status.append({'URL': url, 'Status': 'no_extractable_content'})
-                if content: # Only mark as completed if content was actually extracted
-                    processed_urls_status.append({'URL': url, 'Status': 'completed'})
-                else: # If no content extracted, but no other error, mark as no_extractable_content
-                    processed_urls_status.append({'URL': url, 'Status': 'no_extractable_content'})
+                scraped_data.extend(rows)
+                processed_urls_status.append({'URL': url, 'Status': status})
             
             # COMPREHENSIVE LINK DISCOVERY
             from selenium.webdriver.common.by import By
             from selenium.webdriver.common.action_chains import ActionChains
             
-            # 1. Standard href links
-            for link in soup.find_all('a', href=True):
-                href = link['href']
+            # 1. Links, navigation menus, pagination, form actions, onclick handlers
+            # and data-href/data-url/data-link attributes, all from the lxml tree
+            for href in link_refs:
                 full_url = urljoin(url, href)
                 if is_valid_url(full_url, base_netloc):
                     with visited_lock:
                         if full_url not in visited:
                             new_urls.append((full_url, depth + 1))
             
-            # 2. Navigation menu links (comprehensive)
-            nav_selectors = [
-                'nav a[href]', 'header a[href]', 'footer a[href]',
-                '.nav a[href]', '.navigation a[href]', '.menu a[href]',
-                '.navbar a[href]', '.header a[href]', '.footer a[href]',
-                '[class*="nav"] a[href]', '[class*="menu"] a[href]',
-                '[id*="nav"] a[href]', '[id*="menu"] a[href]'
-            ]
-            
-            for selector in nav_selectors:
-                for link in soup.select(selector):
-                    href = link.get('href')
-                    if href:
-                        full_url = urljoin(url, href)
-                        if is_valid_url(full_url, base_netloc):
-                            with visited_lock:
-                                if full_url not in visited:
-                                    new_urls.append((full_url, depth + 1))
-            
-            # 3. Language and region links (enhanced)
+            # 2. Language and region links (enhanced)
             try:
                 # Look for language dropdowns and click them
                 language_triggers = driver.find_elements(By.XPATH, 
@@ -747,10 +826,11 @@ def comprehensive_crawl_site(start_url):
                 
                 for trigger in language_triggers:
                     try:
+                        watch_dom_mutations(driver)
                         ActionChains(driver).move_to_element(trigger).perform()
-                        time.sleep(2)
+                        wait_for_dom_settle(driver, timeout=2)
                         trigger.click()
-                        time.sleep(3)
+                        wait_for_dom_settle(driver, timeout=3)
                         
                         # Find all links that appeared
                         lang_links = driver.find_elements(By.XPATH, "//a[@href]")
@@ -772,59 +852,7 @@ def comprehensive_crawl_site(start_url):
             except Exception as e:
                 logger.warning(f"Language detection failed: {e}")
             
-            # 4. Pagination links
-            pagination_selectors = [
-                '.pagination a[href]', '.pager a[href]', '.page-numbers a[href]',
-                '[class*="pagination"] a[href]', '[class*="pager"] a[href]',
-                'a[href*="page="]', 'a[href*="p="]', 'a[href*="offset="]'
-            ]
-            
-            for selector in pagination_selectors:
-                for link in soup.select(selector):
-                    href = link.get('href')
-                    if href:
-                        full_url = urljoin(url, href)
-                        if is_valid_url(full_url, base_netloc):
-                            with visited_lock:
-                                if full_url not in visited:
-                                    new_urls.append((full_url, depth + 1))
-            
-            # 5. Form actions and JavaScript links
-            for form in soup.find_all('form', action=True):
-                action = form.get('action')
-                if action:
-                    full_url = urljoin(url, action)
-                    if is_valid_url(full_url, base_netloc):
-                        with visited_lock:
-                            if full_url not in visited:
-                                new_urls.append((full_url, depth + 1))
-            
-            # 6. JavaScript onclick and data attributes
-            import re
-            for element in soup.find_all(['button', 'div', 'span', 'a']):
-                # onclick handlers
-                onclick = element.get('onclick', '')
-                if onclick and 'location' in onclick:
-                    href_match = re.search(r'["\']([^"\']+)["\']', onclick)
-                    if href_match:
-                        href = href_match.group(1)
-                        full_url = urljoin(url, href)
-                        if is_valid_url(full_url, base_netloc):
-                            with visited_lock:
-                                if full_url not in visited:
-                                    new_urls.append((full_url, depth + 1))
-                
-                # data-href, data-url attributes
-                for attr in ['data-href', 'data-url', 'data-link']:
-                    data_url = element.get(attr)
-                    if data_url:
-                        full_url = urljoin(url, data_url)
-                        if is_valid_url(full_url, base_netloc):
-                            with visited_lock:
-                                if full_url not in visited:
-                                    new_urls.append((full_url, depth + 1))
-            
-            # 7. Try to interact with dropdowns and menus
+            # 3. Try to interact with dropdowns and menus
             try:
                 dropdowns = driver.find_elements(By.XPATH, 
                     "//select | //div[contains(@class, 'dropdown')] | "
@@ -833,10 +861,11 @@ def comprehensive_crawl_site(start_url):
                 
                 for dropdown in dropdowns[:5]:  # Limit to first 5 to avoid infinite loops
                     try:
+                        watch_dom_mutations(driver)
                         ActionChains(driver).move_to_element(dropdown).perform()
-                        time.sleep(1)
+                        wait_for_dom_settle(driver, timeout=1)
                         dropdown.click()
-                        time.sleep(2)
+                        wait_for_dom_settle(driver, timeout=2)
                         
                         # Find new links that appeared
                         dropdown_links = driver.find_elements(By.XPATH, "//a[@href]")
@@ -871,10 +900,7 @@ def comprehensive_crawl_site(start_url):
             return []
         finally:
             if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+                release_driver(driver_pool, driver)
 
     # Main comprehensive crawling loop
     processed_count = 0
@@ -932,6 +958,66 @@ def get_scrape_progress(request):
 
 from django.utils.text import slugify
 
+def convert_keys(data_list):
+    """Convert keys to match template variable names without spaces"""
+    new_list = []
+    for item in data_list:
+        new_item = {}
+        for k, v in item.items():
+            new_key = k.replace(' ', '').replace('/', '')
+            new_item[new_key] = v
+        new_list.append(new_item)
+    return new_list
+
+def group_entries(entries):
+    """Group converted entries by URL, language and type in a single pass"""
+    grouped = {}
+    url_headings = {}
+    url_slugs = {}
+    language_groups = {}
+    type_groups = {}
+
+    for entry in entries:
+        url = entry.get('URL')
+        # Skip entries with empty or missing 'URL'
+        if not url:
+            continue
+        if url not in grouped:
+            grouped[url] = {'entries': [], 'total_words': 0}
+            url_headings[url] = entry.get('PageName', url)
+            url_slugs[url] = slugify(url)
+        grouped[url]['entries'].append(entry)
+        grouped[url]['total_words'] += entry['WordCount']
+
+        # Simple heuristic: check for Japanese characters
+        content = entry['Content']
+        if any('\u3040' <= ch <= '\u30ff' for ch in content):
+            lang = 'Japanese'
+        elif any('\u4e00' <= ch <= '\u9fff' for ch in content):
+            lang = 'Chinese'
+        else:
+            lang = 'Other'
+
+        # Example type detection (placeholder, can be improved)
+        lowered = url.lower()
+        if 'translation' in lowered:
+            doc_type = 'Translation'
+        elif 'localization' in lowered:
+            doc_type = 'Localization'
+        else:
+            doc_type = 'Other'
+
+        language_groups.setdefault(lang, set()).add(url)
+        type_groups.setdefault(doc_type, set()).add(url)
+
+    # Convert sets to sorted lists
+    for k in language_groups:
+        language_groups[k] = sorted(language_groups[k])
+    for k in type_groups:
+        type_groups[k] = sorted(type_groups[k])
+
+    return grouped, url_headings, url_slugs, language_groups, type_groups
+
 def view_data(request):
     global scraped_data, show_common_data
     if not scraped_data:
@@ -939,79 +1025,10 @@ def view_data(request):
     if show_common_data:
         common_data = find_common_data(scraped_data)
         filtered_data = filter_data_exclude_common(scraped_data, common_data)
-
-        # Convert keys to match template variable names without spaces
-        def convert_keys(data_list):
-            new_list = []
-            for item in data_list:
-                new_item = {}
-                for k, v in item.items():
-                    new_key = k.replace(' ', '').replace('/', '')
-                    new_item[new_key] = v
-                new_list.append(new_item)
-            return new_list
-
-        common_data = convert_keys(common_data)
-        filtered_data = convert_keys(filtered_data)
-
-        # Group filtered_data by URL with total word count and slugify URLs
-        grouped = {}
-        url_headings = {}
-        url_slugs = {}
-
-        # Filter out entries with empty or missing 'URL'
-        filtered_data = [entry for entry in filtered_data if entry.get('URL')]
-
-        for entry in filtered_data:
-            url = entry['URL']
-            slug = slugify(url)
-            if url not in grouped:
-                grouped[url] = {'entries': [], 'total_words': 0}
-                url_headings[url] = entry.get('PageName', url)
-                url_slugs[url] = slug
-            grouped[url]['entries'].append(entry)
-            grouped[url]['total_words'] += entry['WordCount']
-            
-        # New grouping by language and type
-        language_groups = {}
-        type_groups = {}
-
-        for entry in filtered_data:
-            # Example: determine language from URL or content (simplified)
-            url = entry['URL']
-            content = entry['Content']
-            # Simple heuristic: check for Japanese characters
-            if any('\u3040' <= ch <= '\u30ff' for ch in content):
-                lang = 'Japanese'
-            elif any('\u4e00' <= ch <= '\u9fff' for ch in content):
-                lang = 'Chinese'
-            else:
-                lang = 'Other'
-
-            # Example type detection (placeholder, can be improved)
-            if 'translation' in url.lower():
-                doc_type = 'Translation'
-            elif 'localization' in url.lower():
-                doc_type = 'Localization'
-            else:
-                doc_type = 'Other'
-
-            if lang not in language_groups:
-                language_groups[lang] = set()
-            language_groups[lang].add(url)
-
-            if doc_type not in type_groups:
-                type_groups[doc_type] = set()
-            type_groups[doc_type].add(url)
-
-        # Convert sets to sorted lists
-        for k in language_groups:
-            language_groups[k] = sorted(language_groups[k])
-        for k in type_groups:
-            type_groups[k] = sorted(type_groups[k])
+        grouped, url_headings, url_slugs, language_groups, type_groups = group_entries(convert_keys(filtered_data))
 
         context = {
-            'common_data': common_data,
+            'common_data': convert_keys(common_data),
             'grouped_filtered_data': grouped,
             'url_headings': url_headings,
             'url_slugs': url_slugs,
@@ -1020,70 +1037,7 @@ def view_data(request):
         }
         return render(request, 'scraper/view.html', context)
     else:
-        # Convert keys in scraped_data as well
-        def convert_keys(data_list):
-            new_list = []
-            for item in data_list:
-                new_item = {}
-                for k, v in item.items():
-                    new_key = k.replace(' ', '').replace('/', '')
-                    new_item[new_key] = v
-                new_list.append(new_item)
-            return new_list
-
-        converted_data = convert_keys(scraped_data)
-
-        # Group scraped_data by URL with total word count and slugify URLs
-        grouped = {}
-        url_headings = {}
-        url_slugs = {}
-
-        # Filter out entries with empty or missing 'URL'
-        converted_data = [entry for entry in converted_data if entry.get('URL')]
-
-        for entry in converted_data:
-            url = entry['URL']
-            slug = slugify(url)
-            if url not in grouped:
-                grouped[url] = {'entries': [], 'total_words': 0}
-                url_headings[url] = entry.get('PageName', url)
-                url_slugs[url] = slug
-            grouped[url]['entries'].append(entry)
-            grouped[url]['total_words'] += entry['WordCount']
-        
-        # New grouping by language and type
-        language_groups = {}
-        type_groups = {}
-
-        for entry in converted_data:
-            url = entry['URL']
-            content = entry['Content']
-            if any('\u3040' <= ch <= '\u30ff' for ch in content):
-                lang = 'Japanese'
-            elif any('\u4e00' <= ch <= '\u9fff' for ch in content):
-                lang = 'Chinese'
-            else:
-                lang = 'Other'
-
-            if 'translation' in url.lower():
-                doc_type = 'Translation'
-            elif 'localization' in url.lower():
-                doc_type = 'Localization'
-            else:
-                doc_type = 'Other'
-
-            if lang not in language_groups:
-                language_groups[lang] = set()
-            language_groups[lang].add(url)
-
-            if doc_type not in type_groups:
-                type_groups[doc_type] = set()
-            type_groups[doc_type].add(url)
-
-        for k in language_groups:
-            language_groups[k] = sorted(language_groups[k])
-        for k in type_groups:
-            type_groups[k] = sorted(type_groups[k])
+        grouped, url_headings, url_slugs, language_groups, type_groups = group_entries(convert_keys(scraped_data))
 
         context = {
             'grouped_scraped_data': grouped,
@@ -1113,29 +1067,23 @@ from django.utils.text import slugify
 
 def url_data(request, url_slug):
     global scraped_data
-    # Find original URL from slug
+    # Find original URL from slug and collect its entries in a single pass,
+    # slugifying each distinct URL only once
     original_url = None
+    filtered_entries = []
+    slugs = {}
     for entry in scraped_data:
-        if slugify(entry['URL']) == url_slug:
-            original_url = entry['URL']
-            break
+        url = entry['URL']
+        if original_url is None:
+            if url not in slugs:
+                slugs[url] = slugify(url)
+            if slugs[url] == url_slug:
+                original_url = url
+        if url == original_url:
+            filtered_entries.append(entry)
     if not original_url:
         return render(request, 'scraper/no_data.html')
 
-    # Filter scraped_data for this URL
-    filtered_entries = [entry for entry in scraped_data if entry['URL'] == original_url]
-
-    # Convert keys to match template variable names without spaces
-    def convert_keys(data_list):
-        new_list = []
-        for item in data_list:
-            new_item = {}
-            for k, v in item.items():
-                new_key = k.replace(' ', '').replace('/', '')
-                new_item[new_key] = v
-            new_list.append(new_item)
-        return new_list
-
     converted_entries = convert_keys(filtered_entries)
 
     context = {